@@ -1,57 +1,105 @@
-import numpy as np
 import os
+import queue
 import random
-import matplotlib.pyplot as plt
-from db_requests import get_known_barks, get_parameters, insert_bark
-from time import sleep
 import threading
-from collections import deque
-from pydub import AudioSegment
-from pydub.playback import play
+from db_requests import get_parameters
+from detector_config import DetectorConfig, config_from_parameters
+from bark_events import get_event_log
+from known_barks import KnownBarkStore
+from ring_buffer import RingBuffer
+from spectral import SAMPLE_RATE
+from fingerprint import Fingerprint
+from pipeline import DetectionPipeline
+from time import sleep, time as current_time  # detect_bark reçoit déjà un paramètre time
+from clip_cache import ClipCache
+from metrics import timed, counter
+from gate import BarkGate
+from noise_floor import NoiseFloor
+from trigger import TriggerState, CAPTURING, TRIGGERED, CHECKPOINT, FINAL
 from datetime import datetime
 
-SAMPLE_RATE = 44100
+PRE_TRIGGER_SAMPLES = 22050
+POST_TRIGGER_SAMPLES = SAMPLE_RATE
+RING_BUFFER_SECONDS = 4
+CHECKPOINT_SAMPLES = SAMPLE_RATE // 4  # essai de correspondance toutes les 250 ms pendant la capture
+MIN_EARLY_MATCH_FRAMES = 16  # ~0.4 s de spectrogramme avant un premier essai
+CALLBACK_FLAGS = ("input_overflow", "input_underflow", "output_overflow", "output_underflow", "priming_output")
+
+triggers = counter("triggers")
+merged_triggers = counter("merged_triggers")
+dropped_triggers = counter("dropped_triggers")
+matches = counter("matches")
+early_matches = counter("early_matches")
+callback_flags = {flag: counter(f"callback_{flag}") for flag in CALLBACK_FLAGS}
 
 
 class BarkDetector:
 
-    def __init__(self):
-        self.played_sound_recently = False
+    def __init__(self, known_barks=None, events=None, archive=None):
+        self.config = DetectorConfig()
+        self.config_lock = threading.Lock()  # seulement entre écrivains, la lecture se fait sans verrou
         self.audio_files = None
+        self.clip_cache = ClipCache()
         self.available_voices = ["Papa", "Maman", "Héloïse", "Oscar", "Augustine"]
         self.update_audio_files()
-        self.ref_E = 1.0
-        self.min_time_between_audio = 120
-        self.noise_threshold = 10
-        self.harmonic_resemblance_threshold = 0.5
-        self.amplitude_resemblance_threshold = 0.9
-        self.resemblance_threshold = 0.2
-        self.delay_before_message = 2
-        self.detected_sound_recently = False
-        self.buffer = []  # Tampon pour stocker les données audio avant l'enregistrement
-        self.previous_buffer = deque(maxlen=22050)  # Tampon pour stocker les données audio avant le déclenchement
+        self.noise_floor = NoiseFloor()
+        self.ring_buffer = RingBuffer(RING_BUFFER_SECONDS * SAMPLE_RATE)  # Tampon circulaire des dernières secondes d'audio
+        self.trigger = TriggerState(POST_TRIGGER_SAMPLES, CHECKPOINT_SAMPLES)  # état du callback audio
+        self.burst_counted = False  # la suite de blocs forts en cours a déjà déclenché ou été comptée
+        # État du thread de comparaison, transmis au callback par found_matches
+        self.matched_capture = None
+        self.match_cooldown_end = 0
+        self.found_matches = queue.SimpleQueue()
+        self.fingerprint = None
+        self.fingerprint_capture = None
+        self.fingerprint_position = 0
+        self.gate = BarkGate()
+        self.known_barks = known_barks if known_barks is not None else KnownBarkStore()
+        self.known_barks.reload()
+        self.events = events if events is not None else get_event_log()
+        self.archive = archive  # CaptureArchive optionnelle : garde aussi les fenêtres non reconnues
+        self.pipeline = DetectionPipeline([("features", self.extract_features, 1),
+                                           ("matching", self.match_checkpoint, 1),
+                                           ("action", self.respond, 1)])
+        self.pipeline.start()
         print("Bark detector initialized.")
 
     def update_audio_files(self):
         self.audio_files = self._list_files("./audio")
         print("Audio files: ", self.audio_files)
+        all_files = [file for files in self.audio_files for file in files]
+        self.clip_cache.retain(all_files)
+        self.clip_cache.preload_async(all_files)
 
-    def initialize_thresholds(self):
-        parameters = get_parameters()
-        for param in parameters:
-            if param[0] == "noise_threshold":
-                self.noise_threshold = int(param[1])
-            elif param[0] == "resemblance_threshold":
-                self.resemblance_threshold = float(param[1])
-            elif param[0] == "cooldown":
-                self.min_time_between_audio = int(param[1])
-                self.min_time_between_audio_frames = self.min_time_between_audio * SAMPLE_RATE
-
+    def add_audio_file(self, voice, path):
+        if voice not in self.available_voices:
+            print(f"Unknown voice {voice}, file not added.")
+            return
+        self.audio_files[self.available_voices.index(voice)].append(path)
+        self.clip_cache.preload_async([path])
+
+    def configure(self, **changes):
+        with self.config_lock:
+            self.config = self.config._replace(**changes)
+        return self.config
+
+    def reload_config(self):
+        try:
+            parameters = get_parameters()
+        except Exception as e:
+            print("Error", e)
+            parameters = False
+        if parameters is False:
+            print("Could not load parameters, keeping the current configuration.")
+            return False
+        with self.config_lock:
+            self.config = config_from_parameters(self.config, parameters)
+        print("Configuration: ", self.config)
+        return True
 
     def set_thresholds(self, new_db_threshold, new_resemblance_threshold, new_cooldown):
-        self.noise_threshold = int(new_db_threshold)
-        self.resemblance_threshold = new_resemblance_threshold
-        self.min_time_between_audio = int(new_cooldown)
+        self.configure(noise_threshold=int(new_db_threshold), resemblance_threshold=new_resemblance_threshold,
+                       cooldown=int(new_cooldown))
 
     def _list_files(self, path):
         files = [[] for _ in range(len(self.available_voices))]
@@ -62,55 +110,144 @@ class BarkDetector:
     def _list_files_for_voice(self, path):
         if not os.path.exists(path):
             return []
-        files = os.listdir(path)
+        files = [file for file in os.listdir(path) if not file.startswith(".")]  # ignore les envois en cours
         for i, file in enumerate(files):
             files[i] = os.path.join(path, file)
         return files
 
-    def energy_to_db(self, energy):
-        return 10 * np.log10(energy / self.ref_E)
-
-    def fourier_transform(self, indata):
-        signal_fft = np.fft.fft(indata)
-        signal_fft_power = np.abs(signal_fft)/len(indata)
-
-        return signal_fft_power
-
     def manual_message(self, voice):
+        if str(voice) not in self.available_voices:
+            raise ValueError(f"Unknown voice {voice}.")  # avant d'enregistrer l'événement
         timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        insert_bark([timestamp, "Manual", str(voice)])
+        self.events.record([timestamp, "Manual", str(voice)])
         self.play_sound(str(voice))
 
+    @timed("detect_bark")
     def detect_bark(self, indata, frames, time, status):
-        energy = np.sum(np.square(indata))
-        volume = self.energy_to_db(energy)
-        if not self.detected_sound_recently:
-            self.previous_buffer.extend(indata[:, 0])
-        else:
-            self.buffer.extend(indata[:, 0])
-
-        if volume > self.noise_threshold and not self.played_sound_recently and not self.detected_sound_recently:
-            self.detected_sound_recently = True
-            threading.Timer(1, self.reset_detected_sound_recently).start()
-
-    def reset_detected_sound_recently(self):
-        self.buffer = list(self.previous_buffer) + self.buffer
-        self.detected_sound_recently = False
-        self.handle_high_volume(self.buffer)
-
-    def handle_high_volume(self, indata):
-        power = self.fourier_transform(indata)
-        harmonics = get_highest_harmonics(power)
-        #print(f"{harmonics = }")
-        if self.compare_with_data(harmonics):
-            print("Detected bark at ", datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
-            sleep(self.delay_before_message)
-            self.played_sound_recently = True
-            threading.Timer(self.min_time_between_audio, self.reset_recent_variables).start()
-            voice = self.chose_voice()
-            insert_bark([datetime.now().strftime('%Y-%m-%d %H:%M:%S'), "Automatic", voice])
-            self.play_sound(voice)
-        self.buffer = []
+        if status:
+            for flag in CALLBACK_FLAGS:
+                if getattr(status, flag, False):
+                    callback_flags[flag].inc()
+        config = self.config  # le même instantané pour tout le bloc
+        excess = self.noise_floor.update(indata[:, 0])
+        self.ring_buffer.write(indata[:, 0])
+        position = self.ring_buffer.position
+        self.apply_matches()
+        loud = excess > config.noise_threshold
+        if not loud:
+            self.burst_counted = False
+        elif (self.trigger.state == CAPTURING and not self.burst_counted
+              and (not self.gate.enabled or self.gate.classify(indata[:, 0]))):
+            # Un nouvel aboiement pendant la capture : hors capture, il aurait déclenché sa propre fenêtre
+            self.burst_counted = True
+            self.pipeline.record_merged()
+            merged_triggers.inc()
+
+        event = self.trigger.step(position, loud, self.gate, indata[:, 0])
+        if event == TRIGGERED:
+            self.burst_counted = True
+            triggers.inc()
+        elif event == FINAL:
+            if not self.submit_checkpoint(final=True):
+                dropped_triggers.inc()
+        elif event == CHECKPOINT:
+            self.submit_checkpoint(final=False)
+
+    def apply_matches(self):
+        # Une correspondance (même avant la fin de la fenêtre) termine la capture et lance le délai de silence
+        while True:
+            try:
+                cooldown_end = self.found_matches.get_nowait()
+            except queue.Empty:
+                return
+            self.trigger.start_cooldown(cooldown_end)
+
+    def reset(self):
+        # Uniquement quand aucun flux audio n'appelle detect_bark
+        self.trigger.reset()
+        self.burst_counted = False
+        # Les positions n'avancent pas pendant l'arrêt : le délai du thread de comparaison doit aussi repartir de zéro
+        self.match_cooldown_end = 0
+        while True:
+            try:
+                self.found_matches.get_nowait()
+            except queue.Empty:
+                break
+
+    def submit_checkpoint(self, final):
+        # Un point de contrôle perdu n'est pas grave : le suivant reprend là où l'empreinte s'est arrêtée
+        return self.pipeline.submit((self.trigger.capture, self.trigger.trigger_position - PRE_TRIGGER_SAMPLES,
+                                     self.ring_buffer.position, final))
+
+    @timed("extract_features")
+    def extract_features(self, checkpoint):
+        capture, start, end, final = checkpoint
+        if capture == self.matched_capture:
+            return None
+        if capture != self.fingerprint_capture:
+            self.fingerprint_capture = capture
+            self.fingerprint = Fingerprint()
+            self.fingerprint_position = start
+        # Seuls les échantillons arrivés depuis le point de contrôle précédent sont analysés
+        self.update_fingerprint(self.fingerprint, self.ring_buffer.window(self.fingerprint_position, end))
+        self.fingerprint_position = end
+        if not final and self.fingerprint.frames < MIN_EARLY_MATCH_FRAMES:
+            return None
+        return capture, start, end, final, self.find_harmonics(self.fingerprint)
+
+    def update_fingerprint(self, fingerprint, samples):
+        fingerprint.update(samples)
+
+    def find_harmonics(self, fingerprint):
+        return fingerprint.harmonics()
+
+    @timed("match_checkpoint")
+    def match_checkpoint(self, checkpoint):
+        capture, start, end, final, harmonics = checkpoint
+        # Captures déclenchées avant que le callback n'ait appris la dernière correspondance
+        if capture == self.matched_capture or start + PRE_TRIGGER_SAMPLES < self.match_cooldown_end:
+            return None
+        bark_id, ratio = self.compare_with_data(harmonics)
+        if bark_id is not None or final:
+            self.archive_capture(start, end, bark_id, ratio)
+        if bark_id is None:
+            return None
+        config = self.config
+        self.matched_capture = capture
+        self.match_cooldown_end = end + int((config.delay_before_message + config.cooldown) * SAMPLE_RATE)
+        self.found_matches.put(self.match_cooldown_end)
+        if not final:
+            early_matches.inc()
+        matches.inc()
+        print("Detected bark at ", datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+        return self.chose_voice()
+
+    def archive_capture(self, start, end, bark_id, ratio):
+        if self.archive is None:
+            return
+        try:
+            window = self.ring_buffer.window(start, end)
+        except ValueError as e:
+            print("Capture not archived:", e)
+            return
+        # Heure du déclenchement, déduite du retard du thread de comparaison sur le callback
+        timestamp = current_time() - (self.ring_buffer.position - start - PRE_TRIGGER_SAMPLES) / SAMPLE_RATE
+        self.archive.record(window, timestamp, bark_id, ratio)
+
+    @timed("respond")
+    def respond(self, voice):
+        sleep(self.config.delay_before_message)
+        self.events.record([datetime.now().strftime('%Y-%m-%d %H:%M:%S'), "Automatic", voice])
+        self.play_sound(voice)
+
+    def pipeline_stats(self):
+        return dict(self.pipeline.stats(), gate=self.gate.stats(), state=self.trigger.state)
+
+    def close(self):
+        self.pipeline.stop()
+        self.known_barks.close()
+        if self.archive is not None:
+            self.archive.close()
 
     def chose_voice(self):
         voice = random.randint(0, len(self.audio_files) - 1)
@@ -120,11 +257,13 @@ class BarkDetector:
 
 
     def plot_data(self, indata, power):
+        import matplotlib.pyplot as plt  # outil de débogage : inutile de charger matplotlib au démarrage
         plt.plot(indata, label="indata")
         plt.plot(power, 'o', label="power")
         plt.legend()
         plt.show()
 
+    @timed("play_sound")
     def play_sound(self, voice=None):
         if voice is None:
             voice = random.randint(0, len(self.audio_files) - 1)
@@ -136,57 +275,21 @@ class BarkDetector:
         chosen_file = random.choice(self.audio_files[voice])
         if not chosen_file:
             self.play_sound()
-        audio = AudioSegment.from_file(chosen_file, format="m4a")
+        audio = self.clip_cache.get(chosen_file)
+        from pydub.playback import play
         play(audio)
 
-    def reset_recent_variables(self):
-        self.played_sound_recently = False
+    def reload_known_barks(self):
+        return self.known_barks.reload()
 
+    @timed("compare_with_data")
     def compare_with_data(self, harmonics):
-        known_barks = get_known_barks()
-        harmonics = sorted(harmonics, key=lambda x: x[0])
-        for i, bark in enumerate(known_barks):
-            if self.compare_barks(harmonics, bark):
-                print("Bark detected!, Bark ID: ", i + 1)
-                return True
-        return False
-
-    def compare_barks(self, harmonics, bark):
-        found_resemblance = [False for _ in range(len(harmonics))]
-        if len(found_resemblance) == 0:
-            return
-        for i, (harmonic, amplitude) in enumerate(harmonics):
-            for bark_harmonic, bark_ampl in bark:
-                if self.harmonic_resemblance(harmonic, bark_harmonic) >= self.harmonic_resemblance_threshold:
-                    if self.amplitude_resemblance(amplitude, bark_ampl) > self.amplitude_resemblance_threshold:
-                        found_resemblance[i] = True
-                        break
-        if self.enough_resemblance(found_resemblance):
-            return True
-
-    def harmonic_resemblance(self, harmonic1, harmonic2):
-        harmonic_diff = abs(harmonic1 - harmonic2)
-        return 1/harmonic_diff if harmonic_diff != 0 else 1
-
-    def amplitude_resemblance(self, amplitude1, amplitude2, scale=1.0):
-        amplitude_diff = abs(amplitude1 - amplitude2)
-        return np.exp(-scale * amplitude_diff)
-
-    def enough_resemblance(self, found_resemblance):
-        print(sum(found_resemblance)/len(found_resemblance))
-        return sum(found_resemblance) / len(found_resemblance) > self.resemblance_threshold
-
-
-def get_highest_harmonics(power, threshold_ratio=0.6):
-    harmonics = []
-    max_amplitude = np.max(power)
-    power_normalized = power / max_amplitude
-    for i in range(1, len(power_normalized) // 2):
-        if power_normalized[i] > threshold_ratio:
-            frequency = i * 44100 / len(power_normalized)
-            harmonics.append((frequency, power_normalized[i]))
-            #harmonics.append((i, power_normalized[i]))
-    return harmonics
+        config = self.config
+        bark_id, ratio = self.known_barks.best_match(harmonics, config.harmonic_resemblance_threshold,
+                                                     config.amplitude_resemblance_threshold, config.resemblance_threshold)
+        if bark_id is not None:
+            print("Bark detected!, Bark ID: ", bark_id)
+        return bark_id, ratio
 
 
 if __name__ == "__main__":
@@ -0,0 +1,228 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from server import Server
+from bark_events import close_event_log
+from protocol import MessageType, ProtocolError, FrameDecoder, is_framed, is_partial_magic, encode_frame
+from subscriptions import MAX_PENDING_EVENTS, dropped_events, encode_pushed_event
+from uploads import (AudioUpload, UploadError, CHUNK_SIZE, parse_upload_header, parse_upload_metadata,
+                     split_upload_header, find_end_of_file)
+
+MAX_WORKERS = 4
+IDLE_TIMEOUT = 300  # secondes sans données avant de fermer une connexion
+READ_SIZE = 1024
+
+
+class StreamClient:
+    # Remplace le socket dans Server.process : send() peut être appelé depuis un thread du pool
+
+    def __init__(self, writer, loop):
+        self.writer = writer
+        self.loop = loop
+
+    def send(self, data):
+        self.loop.call_soon_threadsafe(self.writer.write, data)
+        return len(data)
+
+
+class AsyncSubscription:
+    # Une tâche sur la boucle par abonné, pas de thread : push() peut être appelé depuis n'importe quel thread
+
+    def __init__(self, writer, loop, request_id=None):
+        self.writer = writer
+        self.loop = loop
+        self.request_id = request_id
+        self.queue = asyncio.Queue(maxsize=MAX_PENDING_EVENTS)
+        self.task = None
+        loop.call_soon_threadsafe(self.start)
+
+    def start(self):
+        self.task = self.loop.create_task(self.run())
+
+    def push(self, event):
+        try:
+            self.loop.call_soon_threadsafe(self.enqueue, event)
+        except RuntimeError:  # boucle déjà fermée
+            pass
+
+    def enqueue(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            dropped_events.inc()
+
+    async def run(self):
+        while True:
+            event = await self.queue.get()
+            try:
+                self.writer.write(encode_pushed_event(event, self.request_id))
+                # Attend que le client lise : les événements suivants restent dans la file bornée
+                await self.writer.drain()
+            except (OSError, ConnectionError) as e:
+                print(f"Could not push event to subscriber: {e}")
+                break
+
+    def close(self):
+        try:
+            self.loop.call_soon_threadsafe(self.cancel)
+        except RuntimeError:
+            pass
+
+    def cancel(self):
+        if self.task is not None:
+            self.task.cancel()
+
+
+class AsyncServer(Server):
+
+    def __init__(self, bark_detector, max_workers=MAX_WORKERS, idle_timeout=IDLE_TIMEOUT):
+        self.max_workers = max_workers
+        self.idle_timeout = idle_timeout
+        self.loop = None
+        super().__init__(bark_detector)
+
+    def start(self):
+        try:
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            pass
+        if self._bark_detector is not None:
+            self._bark_detector.close()
+        close_event_log()
+
+    async def serve(self):
+        self.loop = asyncio.get_running_loop()
+        self.loop.set_default_executor(ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="command"))
+        server = await asyncio.start_server(self.handle_connection, '', 8081)
+        print("Server is listening on port 8081 (asyncio)")
+        self.load_detector_async()
+        async with server:
+            try:
+                await server.serve_forever()
+            finally:
+                for writer in list(self.connections):
+                    writer.close()
+
+    async def handle_connection(self, reader, writer):
+        self.connections.append(writer)
+        print(f"Connection from {writer.get_extra_info('peername')}")
+        client = StreamClient(writer, self.loop)
+        try:
+            data = await self.read(reader)
+            while data and is_partial_magic(data):
+                more = await self.read(reader)
+                if not more:
+                    break
+                data += more
+            if is_framed(data):
+                await self.handle_framed_connection(reader, writer, client, data)
+            else:
+                await self.handle_legacy_connection(reader, writer, client, data)
+        except asyncio.TimeoutError:
+            print("Connection idle, closing.")
+        except ConnectionResetError:
+            print("Connection reset by peer")
+        except Exception as e:
+            print(f"Error: {e}")
+        finally:
+            print("Connection closed.")
+            self.subscribers.unsubscribe(client)
+            self.connections.remove(writer)
+            writer.close()
+
+    async def handle_legacy_connection(self, reader, writer, client, data):
+        while data:
+            if data.startswith(b"AUDIO_FILE "):
+                parts = split_upload_header(data)
+                while parts is None:  # en-tête coupé entre deux lectures
+                    more = await self.read(reader)
+                    if not more:
+                        raise UploadError("Connection closed before the end of the upload header.")
+                    data += more
+                    parts = split_upload_header(data)
+                header, initial = parts
+                sender, size, checksum = parse_upload_header(header)
+                file_name = await self.receive_upload_async(reader, AudioUpload(sender, size, checksum), initial[:size])
+                await self.loop.run_in_executor(None, self.audio_file_received, sender, file_name)
+                # Une commande envoyée juste après le fichier peut être arrivée dans la même lecture
+                data = initial[size:] or await self.read(reader, client=client)
+                continue
+            header = data.decode()
+            print(header)
+            if header == "AUDIO_FILE":
+                await self.receive_file_async(reader)
+            else:
+                await self.loop.run_in_executor(None, self.process, header, client)
+            await writer.drain()
+            data = await self.read(reader, client=client)
+
+    async def handle_framed_connection(self, reader, writer, client, data):
+        decoder = FrameDecoder()
+        while data:
+            try:
+                frames = decoder.feed(data)
+            except ProtocolError as e:
+                writer.write(encode_frame(MessageType.ERROR, 0, str(e)))
+                await writer.drain()
+                return
+            while frames:
+                for message_type, request_id, payload in frames:
+                    if message_type == MessageType.UPLOAD_BEGIN:
+                        await self.receive_framed_upload_async(reader, writer, decoder, request_id, payload)
+                    else:
+                        await self.loop.run_in_executor(None, self.process_frame, message_type, request_id, payload, client)
+                frames = decoder.feed(b"")
+            await writer.drain()
+            data = await self.read(reader, 65536, client)
+
+    def create_subscription(self, client, request_id):
+        return AsyncSubscription(client.writer, self.loop, request_id)
+
+    async def read(self, reader, size=READ_SIZE, client=None):
+        # Un abonné peut rester silencieux indéfiniment : il attend les événements
+        if client is not None and client in self.subscribers:
+            return await reader.read(size)
+        return await asyncio.wait_for(reader.read(size), self.idle_timeout)
+
+    async def receive_file_async(self, reader):
+        file_data = bytearray()
+        sender = None
+        searched = 0
+        while sender is None:
+            data = await self.read(reader)
+            if not data:
+                print("Upload interrupted before END_OF_FILE.")
+                return
+            file_data += data
+            index = find_end_of_file(file_data, searched)
+            searched = len(file_data)
+            if index != -1:
+                sender = file_data[index:].split(b'END_OF_FILE_', 1)[1].decode()
+                del file_data[index:]
+        await self.loop.run_in_executor(None, self.save_audio_file, file_data, sender)
+
+    async def receive_framed_upload_async(self, reader, writer, decoder, request_id, payload):
+        try:
+            sender, size, checksum = parse_upload_metadata(payload)
+            file_name = await self.receive_upload_async(reader, AudioUpload(sender, size, checksum), decoder.take(size))
+        except (UploadError, ValueError, KeyError) as e:
+            # Le reste du flux n'est plus synchronisé : on ferme la connexion
+            writer.write(encode_frame(MessageType.ERROR, request_id, str(e)))
+            await writer.drain()
+            raise
+        await self.loop.run_in_executor(None, self.audio_file_received, sender, file_name)
+        writer.write(encode_frame(MessageType.RESPONSE, request_id, os.path.basename(file_name)))
+
+    async def receive_upload_async(self, reader, upload, initial=b""):
+        try:
+            if initial:
+                upload.write(initial)
+            while upload.remaining:
+                data = await self.read(reader, min(CHUNK_SIZE, upload.remaining))
+                if not data:
+                    raise UploadError("Connection closed during upload.")
+                upload.write(data)
+        except BaseException:
+            upload.abort()
+            raise
+        return await self.loop.run_in_executor(None, upload.finish)
@@ -0,0 +1,121 @@
+import json
+import os
+import queue
+import threading
+import time
+from db_requests import insert_barks
+
+SPOOL_PATH = "./spool/barks.jsonl"
+REJECTED_PATH = "./spool/rejected.jsonl"  # lignes refusées par la base, gardées pour inspection
+BATCH_SIZE = 20
+FLUSH_INTERVAL = 2.0
+
+
+class BarkEventLog:
+
+    def __init__(self, writer=insert_barks, spool_path=SPOOL_PATH, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL,
+                 rejected_path=REJECTED_PATH):
+        self.writer = writer
+        self.spool_path = spool_path
+        self.rejected_path = rejected_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue()
+        self.spool_lock = threading.Lock()
+        self.listeners = []
+        self.thread = threading.Thread(target=self.run, name="bark-events", daemon=True)
+        self.thread.start()
+
+    def record(self, bark):
+        self.queue.put(list(bark))
+        for listener in self.listeners:
+            listener(bark)
+
+    def run(self):
+        stop = False
+        while not stop:
+            batch = []
+            try:
+                item = self.queue.get(timeout=self.flush_interval)
+                # Le délai part du premier événement du lot : un flux régulier n'attend pas d'en avoir batch_size
+                deadline = time.monotonic() + self.flush_interval
+                while item is not None:
+                    batch.append(item)
+                    if len(batch) >= self.batch_size:
+                        break
+                    item = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                stop = item is None
+            except queue.Empty:
+                pass
+            self.flush(batch)
+
+    def flush(self, batch):
+        if not self.replay_spool():
+            self.spool(batch)
+            return
+        if batch and not self.write(batch):
+            self.spool(batch)
+
+    def write(self, batch):
+        # False seulement si la base est injoignable : le lot est alors gardé pour plus tard
+        rejected = []
+        try:
+            written = self.writer(batch, rejected) is not False
+        except Exception as e:
+            print("Could not write bark events: ", e)
+            return False
+        if rejected:
+            self.append(self.rejected_path, rejected)
+            print(f"{len(rejected)} invalid bark events moved to {self.rejected_path}")
+        return written
+
+    def spool(self, batch):
+        if not batch:
+            return
+        with self.spool_lock:
+            self.append(self.spool_path, batch)
+        print(f"{len(batch)} bark events spooled to {self.spool_path}")
+
+    def append(self, path, barks):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "a") as f:
+            for bark in barks:
+                f.write(json.dumps(bark) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def replay_spool(self):
+        with self.spool_lock:
+            if not os.path.exists(self.spool_path):
+                return True
+            with open(self.spool_path) as f:
+                barks = [json.loads(line) for line in f if line.strip()]
+            if barks and not self.write(barks):
+                return False
+            os.remove(self.spool_path)
+        print(f"{len(barks)} spooled bark events replayed.")
+        return True
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+
+
+_event_log = None
+_event_log_lock = threading.Lock()
+
+
+def get_event_log():
+    global _event_log
+    with _event_log_lock:
+        if _event_log is None:
+            _event_log = BarkEventLog()
+    return _event_log
+
+
+def close_event_log():
+    global _event_log
+    with _event_log_lock:
+        if _event_log is not None:
+            _event_log.close()
+            _event_log = None
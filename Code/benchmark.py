@@ -0,0 +1,225 @@
+import argparse
+import csv
+import json
+import os
+import time
+import numpy as np
+from scipy.io import wavfile
+from BarkDetector import BarkDetector, PRE_TRIGGER_SAMPLES, POST_TRIGGER_SAMPLES
+from detector_config import config_from_parameters
+from known_barks import KnownBarkStore
+from spectral import SAMPLE_RATE
+
+BLOCK_SIZE = 1024
+POSITIVE_LABELS = {"1", "bark", "true", "yes", "oui"}
+REPLAY_COOLDOWN = POST_TRIGGER_SAMPLES / SAMPLE_RATE  # une fenêtre de capture : un aboiement n'est compté qu'une fois
+
+
+class MemoryDatabase:
+    # Remplace MySQL pendant le rejeu : modèles, paramètres et aboiements en mémoire
+
+    def __init__(self, known_barks=None, parameters=None):
+        self.known_barks = known_barks or {}
+        self.parameters = parameters or []  # lignes (id, name, value) comme la table parameters
+        self.barks = []
+
+    def get_known_barks(self):
+        return self.known_barks
+
+    def get_parameters(self):
+        return self.parameters
+
+    def insert_barks(self, barks):
+        self.barks.extend(barks)
+        return True
+
+    def record(self, bark):
+        self.barks.append(list(bark))
+
+
+class ReplayDetector(BarkDetector):
+
+    def __init__(self, database):
+        self.timings = {"stft": [], "harmonics": [], "matching": []}
+        self.detection_delays = []  # secondes d'audio après le déclenchement au moment de la détection
+        super().__init__(known_barks=KnownBarkStore(loader=database.get_known_barks, version_loader=None), events=database)
+        # Seuils de production ; pas d'attente avant la réponse, et un délai de silence juste assez long pour que
+        # la fin d'un aboiement reconnu ne le déclenche pas une seconde fois (reset le remet à zéro entre deux fichiers)
+        with self.config_lock:
+            self.config = config_from_parameters(self.config, database.get_parameters())
+        self.configure(delay_before_message=0, cooldown=REPLAY_COOLDOWN)
+
+    def update_audio_files(self):
+        # Aucun son n'est joué pendant le rejeu : pas de décodage ffmpeg en arrière-plan qui fausserait le débit
+        self.audio_files = [[] for _ in self.available_voices]
+
+    def timed(self, stage, function, *args):
+        start = time.perf_counter()
+        result = function(*args)
+        self.timings[stage].append(time.perf_counter() - start)
+        return result
+
+    def update_fingerprint(self, fingerprint, samples):
+        return self.timed("stft", super().update_fingerprint, fingerprint, samples)
+
+    def find_harmonics(self, fingerprint):
+        return self.timed("harmonics", super().find_harmonics, fingerprint)
+
+    def match_checkpoint(self, checkpoint):
+        voice = super().match_checkpoint(checkpoint)
+        if voice is not None:
+            self.detection_delays.append((checkpoint[2] - checkpoint[1] - PRE_TRIGGER_SAMPLES) / SAMPLE_RATE)
+        return voice
+
+    def compare_with_data(self, harmonics):
+        return self.timed("matching", super().compare_with_data, harmonics)
+
+    def chose_voice(self):
+        return "Replay"
+
+    def play_sound(self, voice=None):
+        pass
+
+
+def load_templates(path):
+    with open(path) as f:
+        templates = json.load(f)
+    return {int(bark_id): [tuple(harmonic) for harmonic in harmonics] for bark_id, harmonics in templates.items()}
+
+
+def load_parameters(path):
+    # JSON {name: value}, mêmes noms que la table parameters
+    with open(path) as f:
+        parameters = json.load(f)
+    return [(i, name, value) for i, (name, value) in enumerate(parameters.items(), 1)]
+
+
+def load_labels(path):
+    labels = {}
+    with open(path, newline="") as f:
+        for row in csv.reader(f):
+            if len(row) >= 2 and not row[0].startswith("#"):
+                labels[row[0].strip()] = row[1].strip().lower() in POSITIVE_LABELS
+    return labels
+
+
+def load_wav(path):
+    sample_rate, data = wavfile.read(path)
+    if sample_rate != SAMPLE_RATE:
+        print(f"Warning: {path} is sampled at {sample_rate} Hz, expected {SAMPLE_RATE} Hz.")
+    if data.ndim > 1:
+        data = data[:, 0]
+    if np.issubdtype(data.dtype, np.integer):
+        data = data / np.iinfo(data.dtype).max
+    return data.astype(np.float32)
+
+
+def replay(detector, samples, block_size=BLOCK_SIZE):
+    # Du silence en fin de fichier laisse se terminer une capture commencée trop tard
+    samples = np.concatenate((samples, np.zeros(POST_TRIGGER_SAMPLES + block_size, dtype=np.float32)))
+    for start in range(0, len(samples), block_size):
+        block = samples[start:start + block_size, None]
+        submitted = detector.pipeline.submitted
+        detector.detect_bark(block, len(block), None, None)
+        if detector.pipeline.submitted != submitted:
+            # Plus rapide que le temps réel : on attend l'analyse avant que le tampon soit réécrit
+            detector.pipeline.wait_idle()
+    detector.pipeline.wait_idle()
+    detector.reset()
+
+
+def summarize(values):
+    if not values:
+        return "n=0"
+    values = np.asarray(values) * 1000
+    return (f"n={len(values)} mean={values.mean():.3f}ms p50={np.percentile(values, 50):.3f}ms "
+            f"p95={np.percentile(values, 95):.3f}ms max={values.max():.3f}ms")
+
+
+def run(directory, templates, labels=None, block_size=BLOCK_SIZE, gain=1.0, noise_threshold=None,
+        resemblance_threshold=None, gate=True, parameters=None):
+    labels = labels or {}
+    database = MemoryDatabase(templates, parameters)
+    detector = ReplayDetector(database)
+    detector.gate.enabled = gate
+    if noise_threshold is not None:
+        detector.configure(noise_threshold=noise_threshold)
+    if resemblance_threshold is not None:
+        detector.configure(resemblance_threshold=resemblance_threshold)
+
+    counts = {"tp": 0, "fp": 0, "fn": 0, "tn": 0}
+    audio_seconds = 0
+    wall_start = time.perf_counter()
+    try:
+        for file in sorted(os.listdir(directory)):
+            if not file.endswith(".wav"):
+                continue
+            samples = load_wav(os.path.join(directory, file)) * gain
+            audio_seconds += len(samples) / SAMPLE_RATE
+            detections = len(database.barks)
+            replay(detector, samples, block_size)
+            detected = len(database.barks) > detections
+            print(f"{file}: {'bark' if detected else 'no bark'}")
+            if file in labels:
+                expected = labels[file]
+                counts[("t" if detected == expected else "f") + ("p" if detected else "n")] += 1
+    finally:
+        detector.close()
+    wall_seconds = time.perf_counter() - wall_start
+
+    report = {"audio_seconds": audio_seconds, "wall_seconds": wall_seconds,
+              "throughput": audio_seconds / wall_seconds if wall_seconds else 0.0,
+              "timings": detector.timings, "detection_delays": detector.detection_delays, "counts": counts,
+              "pipeline": detector.pipeline_stats(), "config": detector.config}
+    labelled_positive = counts["tp"] + counts["fp"]
+    actual_positive = counts["tp"] + counts["fn"]
+    report["precision"] = counts["tp"] / labelled_positive if labelled_positive else None
+    report["recall"] = counts["tp"] / actual_positive if actual_positive else None
+    return report
+
+
+def print_report(report):
+    print()
+    for stage, values in report["timings"].items():
+        print(f"{stage:>10}: {summarize(values)}")
+    if report["detection_delays"]:
+        delays = np.asarray(report["detection_delays"])
+        print(f"Detection delay after trigger: mean={delays.mean():.3f}s max={delays.max():.3f}s")
+    print(f"Throughput: {report['throughput']:.1f} audio-seconds per wall-second "
+          f"({report['audio_seconds']:.1f} s of audio in {report['wall_seconds']:.2f} s)")
+    print(f"Configuration: {report['config']}")
+    print(f"Confusion: {report['counts']}")
+    if report["precision"] is not None:
+        print(f"Precision: {report['precision']:.3f}")
+    if report["recall"] is not None:
+        print(f"Recall: {report['recall']:.3f}")
+    print(f"Pipeline: {report['pipeline']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rejoue des fichiers WAV dans le détecteur sans micro ni MySQL.")
+    parser.add_argument("directory", nargs="?", default="./barks")
+    parser.add_argument("--templates", required=True, help="JSON {bark_id: [[harmonic, amplitude], ...]}")
+    parser.add_argument("--labels", help="CSV 'fichier,label' (label 1/bark pour un aboiement)")
+    parser.add_argument("--block-size", type=int, default=BLOCK_SIZE)
+    parser.add_argument("--gain", type=float, default=1.0)
+    parser.add_argument("--noise-threshold", type=float, help="dB au-dessus du plancher de bruit")
+    parser.add_argument("--resemblance-threshold", type=float)
+    parser.add_argument("--no-gate", action="store_true", help="désactive le filtre rapide avant l'analyse complète")
+    parser.add_argument("--parameters", help="JSON {name: value} des réglages de la table parameters")
+    parser.add_argument("--stored-parameters", action="store_true",
+                        help="lit les réglages dans la base configurée (DB_BACKEND), comme en production")
+    args = parser.parse_args()
+
+    labels = load_labels(args.labels) if args.labels else None
+    parameters = None
+    if args.parameters:
+        parameters = load_parameters(args.parameters)
+    elif args.stored_parameters:
+        from db_requests import get_parameters
+        parameters = get_parameters()
+        if parameters is False:
+            parser.error("could not read the parameters table")
+    report = run(args.directory, load_templates(args.templates), labels, args.block_size, args.gain,
+                 args.noise_threshold, args.resemblance_threshold, not args.no_gate, parameters)
+    print_report(report)
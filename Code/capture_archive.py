@@ -0,0 +1,69 @@
+import os
+import threading
+import numpy as np
+from numpy.lib.format import open_memmap
+from spectral import SAMPLE_RATE
+
+ARCHIVE_DIRECTORY = "./archive"
+ARCHIVE_SLOTS = 64  # captures conservées avant d'écraser les plus anciennes (~18 Mo)
+SLOT_SAMPLES = int(1.6 * SAMPLE_RATE)  # fenêtre avant + après déclenchement (1,5 s) et la fin du dernier bloc
+INDEX_DTYPE = np.dtype([("sequence", "<i8"), ("timestamp", "<f8"), ("length", "<i4"), ("bark_id", "<i4"),
+                        ("score", "<f4")])
+
+
+class CaptureArchive:
+    # Fichiers .npy projetés en mémoire : relisibles par un autre processus (np.load(..., mmap_mode="r"))
+    # pendant que le détecteur continue d'écrire
+
+    def __init__(self, directory=ARCHIVE_DIRECTORY, slots=ARCHIVE_SLOTS, slot_samples=SLOT_SAMPLES, readonly=False):
+        self.directory = directory
+        data_path = os.path.join(directory, "captures.npy")
+        index_path = os.path.join(directory, "index.npy")
+        if readonly or os.path.exists(index_path):
+            mode = "r" if readonly else "r+"
+            self.data = np.load(data_path, mmap_mode=mode)
+            self.index = np.load(index_path, mmap_mode=mode)
+        else:
+            os.makedirs(directory, exist_ok=True)
+            self.data = open_memmap(data_path, mode="w+", dtype=np.float32, shape=(slots, slot_samples))
+            self.index = open_memmap(index_path, mode="w+", dtype=INDEX_DTYPE, shape=(slots,))
+            self.index["sequence"] = -1  # case vide
+        self.next_sequence = int(self.index["sequence"].max(initial=-1)) + 1
+        self.lock = threading.Lock()
+
+    def record(self, samples, timestamp, bark_id=None, score=0.0):
+        with self.lock:
+            sequence = self.next_sequence
+            self.next_sequence += 1
+            slot = sequence % len(self.index)
+            length = min(len(samples), self.data.shape[1])
+            # La case est marquée vide pendant l'écriture : un lecteur ne prend pas un mélange de deux captures
+            self.index["sequence"][slot] = -1
+            self.data[slot, :length] = samples[:length]
+            self.index[slot] = (sequence, timestamp, length, -1 if bark_id is None else bark_id, score)
+        return sequence
+
+    def entries(self, matched=None):
+        entries = np.array(self.index)  # copie de l'index seulement, pas de l'audio
+        entries = entries[entries["sequence"] >= 0]
+        if matched is not None:
+            entries = entries[(entries["bark_id"] >= 0) == matched]
+        return np.sort(entries, order="sequence")
+
+    def clip(self, entry):
+        # Vue sur le fichier, sans copie ; None si la capture a été écrasée depuis
+        slot = entry["sequence"] % len(self.index)
+        if self.index["sequence"][slot] != entry["sequence"]:
+            return None
+        return self.data[slot, :entry["length"]]
+
+    def is_current(self, entry):
+        return self.index["sequence"][entry["sequence"] % len(self.index)] == entry["sequence"]
+
+    def __len__(self):
+        return int(np.count_nonzero(self.index["sequence"] >= 0))
+
+    def close(self):
+        if self.data.mode != "r":
+            self.data.flush()
+            self.index.flush()
@@ -0,0 +1,81 @@
+import os
+import queue
+import threading
+from collections import OrderedDict
+
+CLIP_CACHE_BYTES = 64 * 1024 * 1024
+
+
+def decode_clip(path):
+    from pydub import AudioSegment  # importé au premier décodage, pas au démarrage du serveur
+    file_format = os.path.splitext(path)[1][1:].lower() or "m4a"
+    return AudioSegment.from_file(path, format=file_format)
+
+
+class ClipCache:
+
+    def __init__(self, max_bytes=CLIP_CACHE_BYTES, decoder=decode_clip):
+        self.max_bytes = max_bytes
+        self.decoder = decoder
+        self.clips = OrderedDict()  # chemin -> AudioSegment décodé, du moins au plus récemment utilisé
+        self.size = 0
+        self.lock = threading.Lock()
+        self.preload_queue = queue.Queue()
+        self.preload_thread = None
+
+    def get(self, path):
+        with self.lock:
+            clip = self.clips.get(path)
+            if clip is not None:
+                self.clips.move_to_end(path)
+                return clip
+        clip = self.decoder(path)
+        self.add(path, clip)
+        return clip
+
+    def add(self, path, clip):
+        clip_size = len(clip.raw_data)
+        if clip_size > self.max_bytes:
+            return
+        with self.lock:
+            if path in self.clips:
+                self.size -= len(self.clips.pop(path).raw_data)
+            self.clips[path] = clip
+            self.size += clip_size
+            while self.size > self.max_bytes:
+                _, evicted = self.clips.popitem(last=False)
+                self.size -= len(evicted.raw_data)
+
+    def discard(self, path):
+        with self.lock:
+            clip = self.clips.pop(path, None)
+            if clip is not None:
+                self.size -= len(clip.raw_data)
+
+    def retain(self, paths):
+        paths = set(paths)
+        for path in list(self.clips):
+            if path not in paths:
+                self.discard(path)
+
+    def preload(self, paths):
+        for path in paths:
+            with self.lock:
+                if path in self.clips:
+                    continue
+            try:
+                self.add(path, self.decoder(path))
+            except Exception as e:
+                print(f"Could not decode {path}: {e}")
+
+    def preload_async(self, paths):
+        for path in paths:
+            self.preload_queue.put(path)
+        with self.lock:
+            if self.preload_thread is None:
+                self.preload_thread = threading.Thread(target=self._preload_worker, name="clip-preload", daemon=True)
+                self.preload_thread.start()
+
+    def _preload_worker(self):
+        while True:
+            self.preload([self.preload_queue.get()])
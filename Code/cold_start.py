@@ -0,0 +1,87 @@
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import time
+
+PORT = 8081
+POLL_INTERVAL = 0.005
+END_OF_MESSAGE = b"END_OF_MESSAGE"
+
+
+def wait_for_port(process, host, port, timeout):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            return socket.create_connection((host, port), timeout=timeout)
+        except OSError:
+            time.sleep(POLL_INTERVAL)
+    raise TimeoutError(f"Port {port} not reachable after {timeout} s")
+
+
+def request(client_socket, command):
+    # Ancien protocole texte : la réponse se termine par END_OF_MESSAGE
+    client_socket.sendall(command.encode())
+    response = b""
+    while not response.endswith(END_OF_MESSAGE):
+        data = client_socket.recv(65536)
+        if not data:
+            raise RuntimeError("Connection closed before the response")
+        response += data
+    return response
+
+
+def measure(server_args, host="127.0.0.1", port=PORT, timeout=60):
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "server.py", *server_args], stdout=subprocess.DEVNULL,
+                               stderr=subprocess.DEVNULL, cwd=os.path.dirname(os.path.abspath(__file__)))
+    try:
+        client_socket = wait_for_port(process, host, port, timeout)
+        listening = time.perf_counter() - start
+        with client_socket:
+            client_socket.settimeout(timeout)
+            # Répondu sans le détecteur
+            request(client_socket, "REQUEST_APP_STATE")
+            first_response = time.perf_counter() - start
+            # Nécessite le détecteur : attend la fin du chargement
+            request(client_socket, "REQUEST_PIPELINE_STATS")
+            ready = time.perf_counter() - start
+    finally:
+        process.terminate()
+        process.wait()
+    return {"listening": listening, "first_response": first_response, "ready": ready}
+
+
+def measure_imports(modules):
+    code = ("import time; start = time.perf_counter(); import {0}; "
+            "print(time.perf_counter() - start)")
+    timings = {}
+    for module in modules:
+        output = subprocess.run([sys.executable, "-c", code.format(module)], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+        timings[module] = float(output.stdout.strip()) if output.returncode == 0 else None
+    return timings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mesure le démarrage à froid du serveur.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--async", dest="use_async", action="store_true", help="mesure le serveur asyncio")
+    parser.add_argument("--max-listening", type=float, help="échoue si le port met plus de N secondes à s'ouvrir")
+    args = parser.parse_args()
+
+    for module, seconds in measure_imports(["server", "BarkDetector"]).items():
+        print(f"import {module}: {'failed' if seconds is None else f'{seconds * 1000:.1f} ms'}")
+
+    runs = [measure(["--async"] if args.use_async else []) for _ in range(args.runs)]
+    for stage in ("listening", "first_response", "ready"):
+        values = sorted(run[stage] for run in runs)
+        print(f"{stage:>15}: median={values[len(values) // 2] * 1000:.1f} ms max={values[-1] * 1000:.1f} ms")
+
+    slowest = max(run["listening"] for run in runs)
+    if args.max_listening is not None and slowest > args.max_listening:
+        print(f"Port opened in {slowest:.2f} s, above the {args.max_listening:.2f} s budget.")
+        sys.exit(1)
@@ -0,0 +1,3 @@
+use mokadb;
+
+alter table barks add column source varchar(64);
@@ -0,0 +1,4 @@
+use mokadb;
+
+create index knownbarks_bark_id on knownbarks (bark_id);
+create index barks_date on barks (date);
@@ -7,7 +7,8 @@ create table if not exists knownbarks (
     bark_id int not null,
     harmonic int not null,
     amplitude float not null,
-    unique (bark_id, harmonic, amplitude)
+    unique (bark_id, harmonic, amplitude),
+    index (bark_id)
 );
 
 create table if not exists parameters (
@@ -21,5 +22,7 @@ create table if not exists barks (
     id int primary key auto_increment,
     date timestamp not null,
     mode enum('Automatic', 'Manual', 'Not handled') not null,
-    voice enum('Papa', 'Maman', 'Héloïse', 'Oscar', 'Augustine')
+    voice enum('Papa', 'Maman', 'Héloïse', 'Oscar', 'Augustine'),
+    source varchar(64),
+    index (date)
 );
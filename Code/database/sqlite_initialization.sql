@@ -0,0 +1,32 @@
+-- Même schéma que initialization.sql pour le stockage local (DB_BACKEND=sqlite)
+
+create table if not exists knownbarks (
+    id integer primary key autoincrement,
+    bark_id int not null,
+    harmonic int not null,
+    amplitude float not null,
+    unique (bark_id, harmonic, amplitude)
+);
+
+create table if not exists parameters (
+    id integer primary key autoincrement,
+    name varchar(255) not null,
+    value float not null,
+    unique (name)
+);
+
+create table if not exists barks (
+    id integer primary key autoincrement,
+    date timestamp not null,
+    mode text not null check (mode in ('Automatic', 'Manual', 'Not handled')),
+    voice text check (voice in ('Papa', 'Maman', 'Héloïse', 'Oscar', 'Augustine')),
+    source varchar(64)
+);
+
+create index if not exists knownbarks_bark_id on knownbarks (bark_id);
+create index if not exists barks_date on barks (date);
+
+insert or ignore into parameters (name, value) values ('noise_threshold', 10.0);
+insert or ignore into parameters (name, value) values ('resemblance_threshold', 0.7);
+insert or ignore into parameters (name, value) values ('cooldown', 120);
+insert or ignore into parameters (name, value) values ('delay', 2);
@@ -1,103 +1,90 @@
-from dotenv import load_dotenv
-import os
-import mysql.connector
+from datetime import datetime, timedelta
+from metrics import timed
+from storage import get_backend
 
 
-def connect_to_db():
-    load_dotenv()
-
-    user = os.getenv('DB_USER')
-    password = os.getenv('DB_PASSWORD')
-    host = os.getenv('DB_HOST')
-    database = os.getenv('DB_NAME')
-    port = os.getenv('DB_PORT')
-
-    # Connexion à la base de données
-    cnx = mysql.connector.connect(user=user, password=password, host=host, database=database, port=port)
-    cursor = cnx.cursor()
-    return cnx, cursor
+known_barks_listeners = []
+parameters_listeners = []
 
 
+@timed("db.get_parameters")
 def get_parameters():
-    cnx, cursor = connect_to_db()
+    backend = get_backend()
+    cnx, cursor = backend.connect(prepared=True)
     try:
         query = "SELECT * FROM parameters"
-        cursor.execute(query)
+        cursor.execute(backend.sql(query))
         parameters = cursor.fetchall()
-    except mysql.connector.Error:
+    except backend.Error:
         return False
     finally:
         cursor.close()
         cnx.close()
     return parameters
 
+@timed("db.modify_parameters")
 def modify_parameters(parameters):
-    cnx, cursor = connect_to_db()
+    backend = get_backend()
+    cnx, cursor = backend.connect()
     try:
         for param in parameters:
             query = "UPDATE parameters SET value = %s WHERE name = %s"
-            cursor.execute(query, (param[1], param[0]))
+            cursor.execute(backend.sql(query), (param[1], param[0]))
         cnx.commit()
         print("Parameters updated.")
-    except mysql.connector.Error:
+    except backend.Error:
         return False
     finally:
         cursor.close()
         cnx.close()
+    notify_parameters_changed()
     return True
 
 
-def get_all_known_barks():
-    cnx, cursor = connect_to_db()
-    try:
-        query = "SELECT * FROM knownbarks"
-        cursor.execute(query)
-        barks = cursor.fetchall()
-    except mysql.connector.Error:
-        return False
-    finally:
-        cursor.close()
-        cnx.close()
-    return barks
-
-
-def get_number_of_known_barks():
-    cnx, cursor = connect_to_db()
+@timed("db.get_known_barks")
+def get_known_barks():
+    backend = get_backend()
+    cnx, cursor = backend.connect()
     try:
-        query = "SELECT COUNT(distinct bark_id) FROM knownbarks"
-        cursor.execute(query)
-        number_of_known_barks = cursor.fetchone()[0]
-    except mysql.connector.Error:
+        query = "SELECT bark_id, harmonic, amplitude FROM knownbarks ORDER BY bark_id, harmonic"
+        cursor.execute(backend.sql(query))
+        known_barks = {}
+        for (bark_id, harmonic, amplitude) in cursor.fetchall():
+            known_barks.setdefault(bark_id, []).append((harmonic, amplitude))
+    except backend.Error as e:
+        print("Error", e)
         return False
     finally:
         cursor.close()
         cnx.close()
-    return number_of_known_barks
-
+    return known_barks
 
-def get_known_barks():
-    cnx, cursor = connect_to_db()
+@timed("db.get_known_barks_version")
+def get_known_barks_version():
+    # Change à chaque ajout ou suppression de modèle, y compris depuis un autre processus (listen.py)
+    backend = get_backend()
+    cnx, cursor = backend.connect()
     try:
-        barks = get_all_known_barks()
-        known_barks = [[] for _ in range(get_number_of_known_barks())]
-        for (_, bark_id, harmonic, amplitude) in barks:
-            bark_info = (harmonic, amplitude)
-            known_barks[bark_id - 1].append(bark_info)
-    except mysql.connector.Error as e:
-        print("Error", e)
+        cursor.execute(backend.sql("SELECT MAX(id), COUNT(*) FROM knownbarks"))
+        version = tuple(cursor.fetchone())
+    except backend.Error:
         return False
     finally:
         cursor.close()
         cnx.close()
-    return known_barks
+    return version
 
+@timed("db.get_last_barks")
 def get_last_barks():
-    cnx, cursor = connect_to_db()
+    backend = get_backend()
+    cnx, cursor = backend.connect(prepared=True)
     try:
-        query = "SELECT date, mode, voice FROM barks WHERE date >= CURRENT_TIMESTAMP - INTERVAL 3 DAY ORDER BY date DESC LIMIT 5"
-        cursor.execute(query)
+        query = "SELECT date, mode, voice FROM barks WHERE date >= %s ORDER BY date DESC LIMIT 5"
+        # Date limite calculée ici : même requête pour MySQL et SQLite
+        since = (datetime.now() - timedelta(days=3)).strftime('%Y-%m-%d %H:%M:%S')
+        cursor.execute(backend.sql(query), (since,))
         last_barks = cursor.fetchall()
-    except mysql.connector.Error as e:
+    except backend.Error as e:
         print("Erreur lors de la récupération des derniers aboiements", e)
         return False
     finally:
@@ -105,36 +92,89 @@ def get_last_barks():
         cnx.close()
     return last_barks
 
-def insert_bark(bark: list):
-    cnx, cursor = connect_to_db()
+def bark_source(bark):
+    # Micro ou fichier à l'origine de l'aboiement, absent pour le flux unique historique
+    return bark[3] if len(bark) > 3 else None
+
+@timed("db.insert_barks")
+def insert_barks(barks: list, rejected=None):
+    # Les lignes refusées par la base (mode ou voix invalide) sont ajoutées à rejected au lieu de bloquer le lot
+    backend = get_backend()
+    cnx, cursor = backend.connect()
     try:
-        query = "INSERT INTO barks (date, mode, voice) VALUES (%s, %s, %s)"
-        cursor.execute(query, (bark[0], bark[1], bark[2]))
+        query = backend.sql("INSERT INTO barks (date, mode, voice, source) VALUES (%s, %s, %s, %s)")
+        rows = [(bark[0], bark[1], bark[2], bark_source(bark)) for bark in barks]
+        try:
+            cursor.executemany(query, rows)
+        except backend.InvalidData:
+            cnx.rollback()
+            for bark, row in zip(barks, rows):
+                try:
+                    cursor.execute(query, row)
+                except backend.InvalidData as e:
+                    print("Aboiement rejeté", bark, e)
+                    if rejected is not None:
+                        rejected.append(bark)
         cnx.commit()
-    except mysql.connector.Error:
+    except backend.Error as e:
+        print("Erreur lors de l'enregistrement des aboiements", e)
         return False
     finally:
         cursor.close()
         cnx.close()
     return True
 
+@timed("db.insert_known_bark")
 def insert_known_bark(harmonics: list[[int, float]]):
-    cnx, cursor = connect_to_db()
+    backend = get_backend()
+    cnx, cursor = backend.connect()
     try:
         max_id = get_max_bark_id(cursor)
         for harmonic, amplitude in harmonics:
             query = "INSERT INTO knownbarks (bark_id, harmonic, amplitude) VALUES (%s, %s, %s)"
-            cursor.execute(query, (max_id, harmonic, amplitude))
+            cursor.execute(backend.sql(query), (max_id, harmonic, amplitude))
+        cnx.commit()
+    except backend.Error as e:
+        print(e)
+        return False
+    finally:
+        cursor.close()
+        cnx.close()
+    notify_known_barks_changed()
+    return True
+
+
+@timed("db.insert_known_barks")
+def insert_known_barks(barks: list):
+    backend = get_backend()
+    cnx, cursor = backend.connect()
+    try:
+        max_id = get_max_bark_id(cursor)
+        query = "INSERT INTO knownbarks (bark_id, harmonic, amplitude) VALUES (%s, %s, %s)"
+        cursor.executemany(backend.sql(query), [(max_id + i, harmonic, amplitude)
+                                   for i, harmonics in enumerate(barks) for harmonic, amplitude in harmonics])
         cnx.commit()
-    except mysql.connector.Error as e:
+    except backend.Error as e:
         print(e)
+        cnx.rollback()
         return False
     finally:
         cursor.close()
         cnx.close()
+    notify_known_barks_changed()
     return True
 
 
+def notify_known_barks_changed():
+    for listener in known_barks_listeners:
+        listener()
+
+
+def notify_parameters_changed():
+    for listener in parameters_listeners:
+        listener()
+
+
 def get_max_bark_id(cursor):
     max_id_query = "SELECT MAX(bark_id) FROM knownbarks"
     cursor.execute(max_id_query)
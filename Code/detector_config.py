@@ -0,0 +1,17 @@
+from collections import namedtuple
+
+# Instantané immuable des réglages : le détecteur remplace l'objet entier, les lecteurs ne voient jamais un mélange
+DetectorConfig = namedtuple("DetectorConfig", ["noise_threshold", "harmonic_resemblance_threshold",
+                                               "amplitude_resemblance_threshold", "resemblance_threshold",
+                                               "cooldown", "delay_before_message"],
+                            defaults=[10, 0.5, 0.9, 0.2, 120, 2])
+
+# Nom dans la table parameters -> champ de la configuration
+PARAMETER_FIELDS = {"noise_threshold": "noise_threshold", "resemblance_threshold": "resemblance_threshold",
+                    "cooldown": "cooldown", "delay": "delay_before_message"}
+
+
+def config_from_parameters(config, parameters):
+    # Lignes (id, name, value) renvoyées par get_parameters
+    changes = {PARAMETER_FIELDS[param[1]]: float(param[2]) for param in parameters if param[1] in PARAMETER_FIELDS}
+    return config._replace(**changes)
@@ -0,0 +1,52 @@
+import numpy as np
+from spectral import SAMPLE_RATE, HARMONIC_THRESHOLD_RATIO, get_window
+
+STFT_FRAME_SIZE = 4096  # ~93 ms : même résolution (~10.8 Hz) quelle que soit la durée de la capture
+STFT_HOP_SIZE = 1024
+STFT_WINDOW = "hann"
+
+
+class Fingerprint:
+    # Spectrogramme court terme calculé au fil des blocs ; on garde le maximum de chaque bande sur les trames
+
+    def __init__(self, frame_size=STFT_FRAME_SIZE, hop_size=STFT_HOP_SIZE, sample_rate=SAMPLE_RATE):
+        self.frame_size = frame_size
+        self.hop_size = hop_size
+        self.sample_rate = sample_rate
+        self.window = get_window(STFT_WINDOW, frame_size)
+        self.pending = np.empty(0, dtype=np.float32)  # échantillons pas encore couverts par une trame complète
+        self.peak_hold = np.zeros(frame_size // 2 + 1)
+        self.frames = 0
+
+    def update(self, samples):
+        samples = np.concatenate((self.pending, np.asarray(samples, dtype=np.float32)))
+        count = 0 if len(samples) < self.frame_size else 1 + (len(samples) - self.frame_size) // self.hop_size
+        if count:
+            frames = np.lib.stride_tricks.sliding_window_view(samples, self.frame_size)[::self.hop_size][:count]
+            spectrum = np.abs(np.fft.rfft(frames * self.window, axis=1)) / self.frame_size
+            np.maximum(self.peak_hold, spectrum.max(axis=0), out=self.peak_hold)
+            self.frames += count
+        self.pending = samples[count * self.hop_size:]
+        return count
+
+    def harmonics(self, threshold_ratio=HARMONIC_THRESHOLD_RATIO):
+        power = self.peak_hold
+        max_amplitude = power[1:].max(initial=0)
+        if max_amplitude <= 0:
+            return np.empty((0, 2))
+        # Maxima locaux au-dessus du seuil (la composante continue est ignorée)
+        inner = power[1:-1]
+        peaks = np.flatnonzero((inner > power[:-2]) & (inner >= power[2:]) & (inner > threshold_ratio * max_amplitude)) + 1
+        # Interpolation parabolique sur le log pour situer le pic plus finement que la largeur d'une bande
+        alpha, beta, gamma = (np.log(power[peaks + shift] + 1e-12) for shift in (-1, 0, 1))
+        denominator = alpha - 2 * beta + gamma
+        with np.errstate(divide="ignore", invalid="ignore"):
+            offset = np.where(denominator != 0, 0.5 * (alpha - gamma) / denominator, 0)
+        frequencies = (peaks + offset) * self.sample_rate / self.frame_size
+        return np.column_stack((frequencies, power[peaks] / max_amplitude))
+
+
+def fingerprint_harmonics(samples, threshold_ratio=HARMONIC_THRESHOLD_RATIO):
+    fingerprint = Fingerprint()
+    fingerprint.update(samples)
+    return fingerprint.harmonics(threshold_ratio)
@@ -0,0 +1,68 @@
+from functools import lru_cache
+import numpy as np
+from metrics import counter
+from spectral import SAMPLE_RATE, bin_frequencies
+
+# Petit banc de filtres (Hz) : la bande 300-4000 Hz porte l'essentiel de l'énergie d'un aboiement
+FILTER_BANK = ((0, 300), (300, 1000), (1000, 4000), (4000, SAMPLE_RATE / 2))
+BARK_BANDS = (1, 2)
+MIN_BARK_BAND_RATIO = 0.5
+MAX_ZERO_CROSSING_RATE = 0.3
+MAX_SPECTRAL_FLATNESS = 0.6
+
+gate_passed = counter("gate_passed")
+gate_rejected = counter("gate_rejected")
+
+
+@lru_cache(maxsize=None)
+def band_masks(size, sample_rate=SAMPLE_RATE):
+    frequencies = bin_frequencies(size, sample_rate)
+    return tuple((frequencies >= low) & (frequencies < high) for low, high in FILTER_BANK)
+
+
+def block_features(block, sample_rate=SAMPLE_RATE):
+    block = np.asarray(block, dtype=np.float32)
+    power = np.square(np.abs(np.fft.rfft(block)))
+    total = power.sum()
+    if total <= 0:
+        return 0.0, 0.0, 1.0
+    band_energy = [power[mask].sum() for mask in band_masks(len(block), sample_rate)]
+    bark_band_ratio = sum(band_energy[band] for band in BARK_BANDS) / total
+    zero_crossing_rate = np.count_nonzero(np.signbit(block[1:]) != np.signbit(block[:-1])) / len(block)
+    power = power[1:] + 1e-12
+    spectral_flatness = np.exp(np.mean(np.log(power))) / np.mean(power)
+    return float(bark_band_ratio), float(zero_crossing_rate), float(spectral_flatness)
+
+
+class BarkGate:
+
+    def __init__(self, min_bark_band_ratio=MIN_BARK_BAND_RATIO, max_zero_crossing_rate=MAX_ZERO_CROSSING_RATE,
+                 max_spectral_flatness=MAX_SPECTRAL_FLATNESS, enabled=True):
+        self.min_bark_band_ratio = min_bark_band_ratio
+        self.max_zero_crossing_rate = max_zero_crossing_rate
+        self.max_spectral_flatness = max_spectral_flatness
+        self.enabled = enabled
+        self.passed = 0
+        self.rejected = 0
+
+    def is_bark_like(self, block):
+        if not self.enabled:
+            return True
+        bark_like = self.classify(block)
+        if bark_like:
+            self.passed += 1
+            gate_passed.inc()
+        else:
+            self.rejected += 1
+            gate_rejected.inc()
+        return bark_like
+
+    def classify(self, block):
+        # Sans compter : utilisé aussi pendant une capture, où aucune analyse n'est évitée
+        bark_band_ratio, zero_crossing_rate, spectral_flatness = block_features(block)
+        return (bark_band_ratio >= self.min_bark_band_ratio
+                and zero_crossing_rate <= self.max_zero_crossing_rate
+                and spectral_flatness <= self.max_spectral_flatness)
+
+    def stats(self):
+        return {"passed": self.passed, "avoided_analyses": self.rejected}
@@ -0,0 +1,87 @@
+import threading
+from db_requests import get_known_barks, get_known_barks_version, known_barks_listeners
+from matcher import TemplateMatcher
+
+VERSION_CHECK_INTERVAL = 2.0  # secondes entre deux vérifications de la table knownbarks
+
+
+class KnownBarkStore:
+
+    def __init__(self, loader=get_known_barks, version_loader=get_known_barks_version,
+                 check_interval=VERSION_CHECK_INTERVAL):
+        self.loader = loader
+        self.version_loader = version_loader  # None : seules les écritures de ce processus invalident les modèles
+        self.check_interval = check_interval
+        self.db_version = None
+        self.lock = threading.Lock()
+        self.templates = {}  # bark_id -> harmonics triées par fréquence
+        self.matcher = TemplateMatcher({})
+        self.stale = True
+        known_barks_listeners.append(self.invalidate)
+        self.stop_event = threading.Event()
+        if version_loader is not None:
+            # Vérifiée en arrière-plan : le thread de comparaison ne fait jamais d'aller-retour avec la base
+            self.thread = threading.Thread(target=self.watch_version, name="known-barks-version", daemon=True)
+            self.thread.start()
+
+    def invalidate(self):
+        self.stale = True
+
+    def watch_version(self):
+        while not self.stop_event.wait(self.check_interval):
+            self.check_version()
+
+    def check_version(self):
+        # Les modèles enregistrés par un autre processus n'appellent pas invalidate : on compare la version de la table
+        try:
+            version = self.version_loader()
+        except Exception as e:
+            print("Could not check the known barks version:", e)
+            return False
+        if version is not False and version != self.db_version:
+            return self.reload()
+        return True
+
+    def reload(self):
+        # Version lue avant les modèles : un ajout pendant le chargement sera vu à la vérification suivante
+        try:
+            version = self.version_loader() if self.version_loader is not None else None
+            known_barks = self.loader()
+        except Exception as e:
+            print("Error", e)
+            known_barks = False
+        if known_barks is False:
+            print("Could not load known barks, keeping the previous templates.")
+            return False
+        templates = {bark_id: sorted(harmonics, key=lambda x: x[0]) for bark_id, harmonics in known_barks.items()}
+        matcher = TemplateMatcher(templates)  # construit aussi l'index inversé par fréquence
+        with self.lock:
+            self.templates = templates
+            self.matcher = matcher
+            self.stale = False
+            if version is not False:
+                self.db_version = version
+        print(f"Loaded {len(templates)} known barks.")
+        return True
+
+    def get_templates(self):
+        if self.stale:
+            self.reload()
+        return self.templates
+
+    def get_matcher(self):
+        if self.stale:
+            self.reload()
+        return self.matcher
+
+    def best_match(self, harmonics, harmonic_threshold, amplitude_threshold, resemblance_threshold):
+        return self.get_matcher().best_match(harmonics, harmonic_threshold, amplitude_threshold,
+                                             resemblance_threshold)
+
+    def close(self):
+        self.stop_event.set()
+        if self.invalidate in known_barks_listeners:
+            known_barks_listeners.remove(self.invalidate)
+
+    def __len__(self):
+        return len(self.get_templates())
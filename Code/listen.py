@@ -1,11 +1,15 @@
+import argparse
 import os
+import re
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
 import pygame
 import InquirerPy
 import numpy as np
-from db_requests import insert_known_bark
-from matplotlib import pyplot as plt
-
-pygame.mixer.init()
+from db_requests import insert_known_bark, insert_known_barks
+from fingerprint import Fingerprint
+from capture_archive import CaptureArchive, ARCHIVE_DIRECTORY
+from spectral import SAMPLE_RATE
 
 keep_file = {"name": "Keep", "type": "list", "message": "Voulez-vous conserver ce fichier audio ?", "choices": ["Oui", "Non"]}
 
@@ -19,50 +23,168 @@ def play_audio(file_path):
         pygame.mixer.music.stop()
         pygame.mixer.music.unload()
 
-def fourier_transform(indata):
-    signal_fft = np.fft.fft(indata)
-    signal_fft_power = np.abs(signal_fft)/len(indata)
+def load_capture(file_path):
+    if file_path.endswith(".npy"):
+        return np.load(file_path, mmap_mode="r")
+    # Ancien format texte : str() d'une liste de np.float32
+    with open(file_path) as f:
+        text = re.sub(r"np\.float(?:32|64)\(([^)]*)\)", r"\1", f.read())
+    return np.fromstring(text.strip().strip("[]"), sep=",", dtype=np.float32)
+
+def find_capture(directory, timestamp):
+    for extension in (".npy", ".txt"):
+        buffer_path = os.path.join(directory, f"buffer_{timestamp}{extension}")
+        if os.path.exists(buffer_path):
+            return buffer_path
+    return None
 
-    return signal_fft_power
+def capture_harmonics(file_path):
+    return samples_harmonics(load_capture(file_path))
 
+def samples_harmonics(samples):
+    # Même empreinte que le détecteur, sinon les fréquences ne sont pas comparables
+    fingerprint = Fingerprint()
+    fingerprint.update(samples)
+    return [(float(frequency), float(amplitude)) for frequency, amplitude in fingerprint.harmonics()]
 
 def save_bark(file_path):
-    with open(file_path, "rb") as f:
-        indata = eval(f.read())
-    power = fourier_transform(indata)
-    plot_data(power)
-    harmonics = get_highest_harmonics(power)
+    fingerprint = Fingerprint()
+    fingerprint.update(load_capture(file_path))
+    plot_data(fingerprint.peak_hold)
+    harmonics = [(float(frequency), float(amplitude)) for frequency, amplitude in fingerprint.harmonics()]
     #print(len(harmonics))
     insert_known_bark(harmonics)
 
-def plot_data(power):
-    plt.plot(power, 'o', label="power")
-    plt.legend()
-    plt.show()
-
-def get_highest_harmonics(power, threshold_ratio=0.6):
-    harmonics = []
-    max_amplitude = np.max(power)
-    power_normalized = power / max_amplitude
-    for i in range(1, len(power_normalized) // 2):
-        if power_normalized[i] > threshold_ratio:
-            frequency = i * 44100 / len(power_normalized)
-            harmonics.append((frequency, power_normalized[i]))
-            #harmonics.append((i, power_normalized[i]))
-    return harmonics
+def enroll_directory(directory, workers=None, remove=False):
+    captures = sorted(os.path.join(directory, file) for file in os.listdir(directory)
+                      if file.startswith("buffer_") and file.endswith((".npy", ".txt")))
+    if not captures:
+        print(f"No captures found in {directory}")
+        return False
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        barks = list(executor.map(capture_harmonics, captures))
+    barks = [harmonics for harmonics in barks if harmonics]
+    if not insert_known_barks(barks):
+        return False
+    print(f"{len(barks)} barks enrolled from {len(captures)} captures.")
+    if remove:
+        for capture in captures:
+            timestamp = os.path.basename(capture)[len("buffer_"):].rsplit(".", 1)[0]
+            os.remove(capture)
+            wav_path = os.path.join(directory, f"bark_{timestamp}.wav")
+            if os.path.exists(wav_path):
+                os.remove(wav_path)
+    return True
 
-if __name__ == "__main__":
-    for file in os.listdir("./barks"):
+def review_directory(directory):
+    pygame.mixer.init()
+    for file in os.listdir(directory):
         if file.endswith(".wav"):
             timestamp = file.split("_", maxsplit=1)[1].split(".")[0]
             print(f"Playing audio from {timestamp}")
-            file_path = os.path.join("./barks", file)
-            buffer_path = os.path.join("./barks", f"buffer_{timestamp}.txt")
+            file_path = os.path.join(directory, file)
+            buffer_path = find_capture(directory, timestamp)
             play_audio(file_path)
             while pygame.mixer.music.get_busy():
                 continue
             answer = InquirerPy.prompt(keep_file)
-            if answer["Keep"] == "Oui":
+            if answer["Keep"] == "Oui" and buffer_path:
                 save_bark(buffer_path)
             os.remove(file_path)
-            os.remove(buffer_path)
+            if buffer_path:
+                os.remove(buffer_path)
+
+def describe_capture(entry):
+    date = datetime.fromtimestamp(entry["timestamp"]).strftime('%Y-%m-%d %H:%M:%S')
+    return f"Capture {entry['sequence']} du {date} (score {entry['score']:.2f})"
+
+def play_samples(samples):
+    peak = np.max(np.abs(samples))
+    if peak > 0:
+        samples = samples / peak
+    sound = pygame.mixer.Sound(buffer=np.int16(samples * 32767).tobytes())
+    sound.play()
+    while pygame.mixer.get_busy():
+        pygame.time.Clock().tick(10)
+
+def last_reviewed(directory):
+    # Numéro de la dernière capture déjà passée en revue, pour ne pas l'enregistrer deux fois
+    path = os.path.join(directory, "reviewed.txt")
+    if not os.path.exists(path):
+        return -1
+    with open(path) as f:
+        return int(f.read().strip() or -1)
+
+def mark_reviewed(directory, sequence):
+    with open(os.path.join(directory, "reviewed.txt"), "w") as f:
+        f.write(str(sequence))
+
+def missed_captures(archive):
+    entries = archive.entries(matched=False)
+    return entries[entries["sequence"] > last_reviewed(archive.directory)]
+
+def enroll_archive(directory):
+    # Lecture seule : le détecteur peut continuer à écrire dans l'archive
+    archive = CaptureArchive(directory, readonly=True)
+    entries = missed_captures(archive)
+    barks = []
+    for entry in entries:
+        clip = archive.clip(entry)
+        if clip is None:
+            continue
+        harmonics = samples_harmonics(clip)
+        if archive.is_current(entry) and harmonics:  # pas écrasée pendant l'analyse
+            barks.append(harmonics)
+    if not barks:
+        print(f"No missed captures in {directory}")
+        return False
+    if not insert_known_barks(barks):
+        return False
+    mark_reviewed(directory, entries["sequence"][-1])
+    print(f"{len(barks)} barks enrolled from the archive.")
+    return True
+
+def review_archive(directory):
+    pygame.mixer.init(frequency=SAMPLE_RATE, size=-16, channels=1)
+    archive = CaptureArchive(directory, readonly=True)
+    for entry in missed_captures(archive):
+        clip = archive.clip(entry)
+        if clip is None:
+            continue
+        print(describe_capture(entry))
+        samples = np.array(clip)  # copie : la case peut être réutilisée pendant l'écoute
+        if not archive.is_current(entry):
+            print("Capture overwritten, skipped.")
+            continue
+        play_samples(samples)
+        answer = InquirerPy.prompt(keep_file)
+        if answer["Keep"] == "Oui":
+            insert_known_bark(samples_harmonics(samples))
+        mark_reviewed(directory, entry["sequence"])
+
+def plot_data(power):
+    from matplotlib import pyplot as plt  # seulement en mode interactif
+    plt.plot(power, 'o', label="power")
+    plt.legend()
+    plt.show()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Enregistre les aboiements capturés comme modèles connus.")
+    parser.add_argument("directory", nargs="?")
+    parser.add_argument("--batch", action="store_true", help="enregistre toutes les captures sans confirmation")
+    parser.add_argument("--workers", type=int, help="nombre de processus pour le mode batch")
+    parser.add_argument("--remove", action="store_true", help="supprime les captures enregistrées en mode batch")
+    parser.add_argument("--archive", action="store_true",
+                        help="lit les captures non reconnues de l'archive du détecteur (directory = dossier de l'archive)")
+    args = parser.parse_args()
+
+    if args.archive:
+        directory = args.directory or ARCHIVE_DIRECTORY
+        if args.batch:
+            enroll_archive(directory)
+        else:
+            review_archive(directory)
+    elif args.batch:
+        enroll_directory(args.directory or "./barks", args.workers, args.remove)
+    else:
+        review_directory(args.directory or "./barks")
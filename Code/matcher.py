@@ -0,0 +1,100 @@
+import numpy as np
+
+MAX_BROADCAST_SIZE = 2 ** 20  # nombre max d'éléments par bloc de comparaison
+INDEX_BIN_WIDTH = 2.0  # Hz, largeur des cases de l'index inversé
+
+
+def harmonic_resemblance(harmonic1, harmonic2):
+    harmonic_diff = np.abs(harmonic1 - harmonic2)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(harmonic_diff != 0, 1 / harmonic_diff, 1)
+
+
+def amplitude_resemblance(amplitude1, amplitude2, scale=1.0):
+    amplitude_diff = np.abs(amplitude1 - amplitude2)
+    return np.exp(-scale * amplitude_diff)
+
+
+class TemplateMatcher:
+
+    def __init__(self, templates):
+        self.bark_ids = np.asarray(list(templates.keys()), dtype=int)
+        max_harmonics = max((len(harmonics) for harmonics in templates.values()), default=0)
+        self.harmonics = np.full((len(templates), max_harmonics), np.nan)
+        self.amplitudes = np.full((len(templates), max_harmonics), np.nan)
+        for i, harmonics in enumerate(templates.values()):
+            if harmonics:
+                self.harmonics[i, :len(harmonics)], self.amplitudes[i, :len(harmonics)] = zip(*harmonics)
+        self.build_index()
+
+    def build_index(self):
+        # Index inversé : chaque harmonique des modèles, triée par case de fréquence quantifiée
+        rows, columns = np.nonzero(~np.isnan(self.harmonics))
+        bins = np.floor(self.harmonics[rows, columns] / INDEX_BIN_WIDTH).astype(int)
+        order = np.argsort(bins, kind="stable")
+        self.index_bins = bins[order]
+        self.index_rows = rows[order]
+        self.index_frequencies = self.harmonics[rows, columns][order]
+        self.index_amplitudes = self.amplitudes[rows, columns][order]
+
+    def lookup(self, frequencies, tolerance):
+        # Renvoie, pour chaque entrée de l'index proche d'une fréquence demandée, (numéro de la fréquence, position)
+        frequencies = np.asarray(frequencies, dtype=float)
+        low = np.floor((frequencies - tolerance) / INDEX_BIN_WIDTH).astype(int) - 1
+        high = np.floor((frequencies + tolerance) / INDEX_BIN_WIDTH).astype(int) + 1
+        starts = np.searchsorted(self.index_bins, low, side="left")
+        lengths = np.searchsorted(self.index_bins, high, side="right") - starts
+        queries = np.repeat(np.arange(len(frequencies)), lengths)
+        offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        return queries, np.repeat(starts, lengths) + offsets
+
+    def __len__(self):
+        return len(self.bark_ids)
+
+    def resemblance(self, harmonics, harmonic_threshold, amplitude_threshold, rows=None):
+        harmonics = np.asarray(harmonics, dtype=float).reshape(-1, 2)
+        template_rows = self.harmonics if rows is None else self.harmonics[rows]
+        template_amplitude_rows = self.amplitudes if rows is None else self.amplitudes[rows]
+        ratios = np.zeros(len(template_rows))
+        if len(harmonics) == 0 or len(template_rows) == 0 or self.harmonics.shape[1] == 0:
+            return ratios
+        frequencies = harmonics[None, :, 0, None]
+        amplitudes = harmonics[None, :, 1, None]
+        # Découpage en blocs pour borner la mémoire du broadcast (T, m, K)
+        chunk = max(1, MAX_BROADCAST_SIZE // (len(harmonics) * self.harmonics.shape[1]))
+        for start in range(0, len(template_rows), chunk):
+            template_harmonics = template_rows[start:start + chunk, None, :]
+            template_amplitudes = template_amplitude_rows[start:start + chunk, None, :]
+            # Les NaN du remplissage donnent toujours False dans les comparaisons
+            with np.errstate(invalid="ignore"):
+                harmonic_ok = harmonic_resemblance(frequencies, template_harmonics) >= harmonic_threshold
+                amplitude_ok = amplitude_resemblance(amplitudes, template_amplitudes) > amplitude_threshold
+            found_resemblance = np.any(harmonic_ok & amplitude_ok, axis=2)
+            ratios[start:start + chunk] = found_resemblance.sum(axis=1) / len(harmonics)
+        return ratios
+
+    def best_match(self, harmonics, harmonic_threshold, amplitude_threshold, resemblance_threshold):
+        # Seules les paires (harmonique demandée, harmonique d'un modèle) voisines dans l'index sont comparées
+        harmonics = np.asarray(harmonics, dtype=float).reshape(-1, 2)
+        if len(harmonics) == 0 or len(self.index_bins) == 0:
+            return None, 0.0
+        if harmonic_threshold <= 0:
+            # Toutes les fréquences se ressemblent : l'index ne réduit rien
+            ratios = self.resemblance(harmonics, harmonic_threshold, amplitude_threshold)
+            rows = np.arange(len(self.bark_ids))
+        else:
+            queries, positions = self.lookup(harmonics[:, 0], 1 / harmonic_threshold)
+            harmonic_ok = harmonic_resemblance(harmonics[queries, 0], self.index_frequencies[positions]) >= harmonic_threshold
+            amplitude_ok = amplitude_resemblance(harmonics[queries, 1], self.index_amplitudes[positions]) > amplitude_threshold
+            matched = harmonic_ok & amplitude_ok
+            # Une harmonique demandée compte une seule fois par modèle, même si plusieurs harmoniques lui ressemblent
+            pairs = np.unique(self.index_rows[positions[matched]] * len(harmonics) + queries[matched])
+            if len(pairs) == 0:
+                return None, 0.0
+            rows, counts = np.unique(pairs // len(harmonics), return_counts=True)
+            ratios = counts / len(harmonics)
+        # Meilleur score, puis plus petit identifiant en cas d'égalité : indépendant de l'ordre de la base
+        best = np.lexsort((self.bark_ids[rows], -ratios))[0]
+        if ratios[best] <= resemblance_threshold:
+            return None, float(ratios[best])
+        return int(self.bark_ids[rows[best]]), float(ratios[best])
@@ -0,0 +1,151 @@
+import json
+import threading
+import time
+from bisect import bisect_left
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Bornes des histogrammes de latence, en millisecondes
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class Counter:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.value = 0
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def snapshot(self):
+        return self.value
+
+
+class Histogram:
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+            self.max = max(self.max, value)
+
+    def snapshot(self):
+        with self.lock:
+            buckets = {str(bound): count for bound, count in zip(self.buckets, self.counts)}
+            buckets["+Inf"] = self.counts[-1]
+            return {"count": self.count, "sum": self.sum, "max": self.max,
+                    "mean": self.sum / self.count if self.count else 0.0, "buckets": buckets}
+
+
+class Registry:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.collectors = {}
+
+    def counter(self, name):
+        with self.lock:
+            return self.counters.setdefault(name, Counter())
+
+    def histogram(self, name):
+        with self.lock:
+            return self.histograms.setdefault(name, Histogram())
+
+    def register_collector(self, name, collector):
+        with self.lock:
+            self.collectors[name] = collector
+
+    def timed(self, name):
+        return Timer(self.histogram(name))
+
+    def snapshot(self):
+        with self.lock:
+            counters = dict(self.counters)
+            histograms = dict(self.histograms)
+            collectors = dict(self.collectors)
+        snapshot = {"counters": {name: counter.snapshot() for name, counter in counters.items()},
+                    "latency_ms": {name: histogram.snapshot() for name, histogram in histograms.items()}}
+        for name, collector in collectors.items():
+            try:
+                snapshot[name] = collector()
+            except Exception as e:
+                snapshot[name] = {"error": str(e)}
+        return snapshot
+
+    def to_json(self):
+        return json.dumps(self.snapshot())
+
+
+class Timer:
+    # Utilisable comme gestionnaire de contexte ou comme décorateur
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+        self.local = threading.local()
+
+    def __enter__(self):
+        self.local.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe((time.perf_counter() - self.local.start) * 1000)
+        return False
+
+    def __call__(self, function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.histogram.observe((time.perf_counter() - start) * 1000)
+        return wrapper
+
+
+registry = Registry()
+
+
+def counter(name):
+    return registry.counter(name)
+
+
+def timed(name):
+    return registry.timed(name)
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = registry.to_json().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port, host="127.0.0.1"):
+    http_server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=http_server.serve_forever, name="metrics-http", daemon=True).start()
+    print(f"Metrics available on http://{host}:{port}/metrics")
+    return http_server
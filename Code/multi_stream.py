@@ -0,0 +1,209 @@
+import argparse
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import numpy as np
+from BarkDetector import PRE_TRIGGER_SAMPLES, POST_TRIGGER_SAMPLES, RING_BUFFER_SECONDS
+from bark_events import get_event_log, close_event_log
+from benchmark import load_wav
+from db_requests import get_parameters
+from detector_config import DetectorConfig, config_from_parameters
+from gate import BarkGate
+from known_barks import KnownBarkStore
+from matcher import TemplateMatcher
+from noise_floor import NoiseFloor
+from ring_buffer import RingBuffer
+from fingerprint import fingerprint_harmonics
+from spectral import SAMPLE_RATE
+from trigger import TriggerState, TRIGGERED, FINAL
+
+BLOCK_SIZE = 1024
+MAX_IN_FLIGHT = 2  # fenêtres en cours d'analyse par source
+
+_matcher = None
+_config = None
+
+
+def load_config():
+    # Mêmes réglages que le détecteur principal (table parameters)
+    parameters = get_parameters()
+    if parameters is False:
+        print("Could not load parameters, using the default configuration.")
+        return DetectorConfig()
+    return config_from_parameters(DetectorConfig(), parameters)
+
+
+def init_worker(templates, config):
+    global _matcher, _config
+    _matcher = TemplateMatcher(templates)
+    _config = config
+
+
+def analyze_window(window):
+    # Exécuté dans un processus du pool : FFT, harmoniques et comparaison sans le GIL du processus principal
+    harmonics = fingerprint_harmonics(window)
+    return _matcher.best_match(harmonics, _config.harmonic_resemblance_threshold,
+                               _config.amplitude_resemblance_threshold, _config.resemblance_threshold)
+
+
+class StreamCapture:
+
+    def __init__(self, source, detector, blocking=False):
+        self.source = source
+        self.detector = detector
+        self.blocking = blocking
+        self.ring_buffer = RingBuffer(RING_BUFFER_SECONDS * SAMPLE_RATE)
+        self.noise_floor = NoiseFloor()
+        self.gate = BarkGate()
+        self.trigger = TriggerState(POST_TRIGGER_SAMPLES)  # même machine à états que BarkDetector
+        # Fin du délai de silence, décidée par le thread des résultats et appliquée par le callback
+        self.match_cooldown_end = 0
+        self.found_matches = queue.SimpleQueue()
+        self.in_flight = threading.BoundedSemaphore(MAX_IN_FLIGHT)
+        self.triggers = 0
+        self.dropped = 0
+        self.overflows = 0
+
+    def callback(self, indata, frames, time, status):
+        if status and getattr(status, "input_overflow", False):
+            self.overflows += 1
+        excess = self.noise_floor.update(indata[:, 0])
+        self.ring_buffer.write(indata[:, 0])
+        position = self.ring_buffer.position
+        self.apply_matches()
+        event = self.trigger.step(position, excess > self.detector.config.noise_threshold, self.gate, indata[:, 0])
+        if event == TRIGGERED:
+            self.triggers += 1
+        elif event == FINAL:
+            self.submit(self.trigger.trigger_position - PRE_TRIGGER_SAMPLES, position)
+
+    def apply_matches(self):
+        while True:
+            try:
+                cooldown_end = self.found_matches.get_nowait()
+            except queue.Empty:
+                return
+            self.trigger.start_cooldown(cooldown_end)
+
+    def submit(self, start, end):
+        if not self.in_flight.acquire(blocking=self.blocking):
+            self.dropped += 1
+            return
+        # Copie nécessaire : la fenêtre est envoyée à un autre processus
+        window = np.array(self.ring_buffer.window(start, end))
+        future = self.detector.executor.submit(analyze_window, window)
+        future.add_done_callback(lambda future: self.on_result(future, start, end))
+
+    def on_result(self, future, start, end):
+        self.in_flight.release()
+        try:
+            bark_id, ratio = future.result()
+        except Exception as e:
+            print(f"[{self.source}] Analysis failed: {e}")
+            return
+        # Fenêtre déclenchée avant que le callback n'ait appris la correspondance précédente
+        if bark_id is None or start + PRE_TRIGGER_SAMPLES < self.match_cooldown_end:
+            return
+        self.match_cooldown_end = end + int(self.detector.config.cooldown * SAMPLE_RATE)
+        self.found_matches.put(self.match_cooldown_end)
+        self.detector.on_detection(self.source, bark_id, ratio)
+
+    def wait_idle(self):
+        for _ in range(MAX_IN_FLIGHT):
+            self.in_flight.acquire()
+        for _ in range(MAX_IN_FLIGHT):
+            self.in_flight.release()
+
+    def stats(self):
+        return {"triggers": self.triggers, "dropped": self.dropped, "overflows": self.overflows,
+                "state": self.trigger.state, "gate": self.gate.stats(), "noise_floor": self.noise_floor.stats()}
+
+
+class MultiStreamDetector:
+
+    def __init__(self, workers=None, config=None, events=None, known_barks=None):
+        self.config = config if config is not None else load_config()
+        self.events = events if events is not None else get_event_log()
+        known_barks = known_barks if known_barks is not None else KnownBarkStore()
+        self.executor = ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=init_worker,
+                                            initargs=(known_barks.get_templates(), self.config))
+        self.captures = {}
+        self.lock = threading.Lock()
+        self.detections = []
+
+    def add_source(self, source, blocking=False):
+        capture = StreamCapture(source, self, blocking)
+        self.captures[source] = capture
+        return capture
+
+    def on_detection(self, source, bark_id, ratio):
+        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        with self.lock:
+            self.detections.append((timestamp, source, bark_id, ratio))
+        print(f"[{source}] Bark detected at {timestamp}, Bark ID: {bark_id} ({ratio:.2f})")
+        self.events.record([timestamp, "Not handled", None, str(source)])
+
+    def run_devices(self, devices, stop_event):
+        import sounddevice as sd  # PortAudio n'est pas nécessaire pour rejouer des fichiers
+        streams = [sd.InputStream(callback=self.add_source(f"device:{device}").callback, channels=1, device=device,
+                                  samplerate=SAMPLE_RATE) for device in devices]
+        for stream in streams:
+            stream.start()
+        print(f"Listening on {len(streams)} devices.")
+        try:
+            while not stop_event.is_set():
+                time.sleep(1)
+        finally:
+            for stream in streams:
+                stream.stop()
+                stream.close()
+
+    def run_files(self, files, realtime=False):
+        threads = [threading.Thread(target=self.replay_file, args=(file, load_wav(file), realtime)) for file in files]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def replay_file(self, file, samples, realtime=False):
+        capture = self.add_source(f"file:{os.path.basename(file)}", blocking=not realtime)
+        samples = np.concatenate((samples, np.zeros(POST_TRIGGER_SAMPLES + BLOCK_SIZE, dtype=np.float32)))
+        for start in range(0, len(samples), BLOCK_SIZE):
+            block = samples[start:start + BLOCK_SIZE, None]
+            capture.callback(block, len(block), None, None)
+            if realtime:
+                time.sleep(len(block) / SAMPLE_RATE)
+        capture.wait_idle()
+
+    def stats(self):
+        return {source: capture.stats() for source, capture in self.captures.items()}
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Détection sur plusieurs micros ou fichiers en parallèle.")
+    parser.add_argument("--device", type=int, action="append", default=[], help="numéro de périphérique d'entrée")
+    parser.add_argument("--file", action="append", default=[], help="fichier WAV à rejouer")
+    parser.add_argument("--workers", type=int, help="nombre de processus d'analyse")
+    parser.add_argument("--realtime", action="store_true", help="rejouer les fichiers à vitesse réelle")
+    args = parser.parse_args()
+
+    detector = MultiStreamDetector(workers=args.workers)
+    try:
+        if args.file:
+            detector.run_files(args.file, args.realtime)
+        if args.device:
+            stop_event = threading.Event()
+            try:
+                detector.run_devices(args.device, stop_event)
+            except KeyboardInterrupt:
+                print("Enregistrement arrêté.")
+    finally:
+        detector.close()
+        print(detector.stats())
+        close_event_log()
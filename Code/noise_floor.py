@@ -0,0 +1,45 @@
+import numpy as np
+from gate import FILTER_BANK, band_masks
+from spectral import SAMPLE_RATE
+
+FLOOR_QUANTILE = 0.2  # le plancher suit le 20e centile du niveau de chaque bande
+FLOOR_ADAPTATION = 40.0  # dB par seconde : le plancher descend à 32 dB/s et monte à 8 dB/s
+ENERGY_EPSILON = 1e-12  # -120 dB pour un bloc de silence numérique
+
+
+class NoiseFloor:
+    # Centile glissant par bande, mis à jour en temps constant à chaque bloc du callback
+
+    def __init__(self, quantile=FLOOR_QUANTILE, adaptation=FLOOR_ADAPTATION, sample_rate=SAMPLE_RATE):
+        self.quantile = quantile
+        self.adaptation = adaptation
+        self.sample_rate = sample_rate
+        self.floor = None  # dB par bande
+        self.level = None
+        self.excess = 0.0
+
+    def band_levels(self, block):
+        block = np.asarray(block, dtype=np.float32)
+        # Énergie moyenne par échantillon : ne dépend pas de la taille du bloc
+        power = np.square(np.abs(np.fft.rfft(block))) / len(block) ** 2
+        energies = np.array([power[mask].sum() for mask in band_masks(len(block), self.sample_rate)])
+        return 10 * np.log10(energies + ENERGY_EPSILON)
+
+    def update(self, block):
+        level = self.band_levels(block)
+        if self.floor is None:
+            self.floor = level.copy()
+        excess = float(np.max(level - self.floor))
+        # Monte de step * q quand le niveau dépasse le plancher, descend de step * (1 - q) sinon :
+        # à l'équilibre, une fraction q des blocs est en dessous (le q-ième centile) et 1 - q au-dessus
+        step = self.adaptation * len(block) / self.sample_rate
+        self.floor += np.where(level > self.floor, step * self.quantile, -step * (1 - self.quantile))
+        self.level = level
+        self.excess = excess
+        return excess
+
+    def stats(self):
+        if self.floor is None:
+            return {"bands": FILTER_BANK, "floor_db": None, "level_db": None, "excess_db": None}
+        return {"bands": FILTER_BANK, "floor_db": [round(float(value), 1) for value in self.floor],
+                "level_db": [round(float(value), 1) for value in self.level], "excess_db": round(self.excess, 1)}
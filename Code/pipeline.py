@@ -0,0 +1,117 @@
+import queue
+import threading
+
+
+class PipelineStage:
+
+    def __init__(self, name, handler, queue_size, workers):
+        self.name = name
+        self.handler = handler
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.workers = workers
+        self.next_stage = None
+        self.threads = []
+        self.lock = threading.Lock()
+        self.processed = 0
+        self.failed = 0
+        self.blocked = 0  # nombre de fois où l'étape suivante était pleine
+        self.max_depth = 0
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self.run, name=f"{self.name}-{i}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def put(self, item, block=True):
+        if block and self.queue.full():
+            with self.lock:
+                self.blocked += 1
+        self.queue.put(item, block=block)
+        with self.lock:
+            self.max_depth = max(self.max_depth, self.queue.qsize())
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                self.queue.task_done()
+                break
+            try:
+                result = self.handler(item)
+            except Exception as e:
+                print(f"Error in {self.name} stage: {e}")
+                with self.lock:
+                    self.failed += 1
+                self.queue.task_done()
+                continue
+            with self.lock:
+                self.processed += 1
+            if result is not None and self.next_stage is not None:
+                self.next_stage.put(result)
+            self.queue.task_done()
+
+    def stop(self):
+        for _ in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+
+    def stats(self):
+        with self.lock:
+            return {"depth": self.queue.qsize(), "max_depth": self.max_depth, "processed": self.processed,
+                    "failed": self.failed, "blocked": self.blocked}
+
+
+class DetectionPipeline:
+
+    def __init__(self, stages, queue_size=4):
+        self.stages = [PipelineStage(name, handler, queue_size, workers) for name, handler, workers in stages]
+        for stage, next_stage in zip(self.stages, self.stages[1:]):
+            stage.next_stage = next_stage
+        self.lock = threading.Lock()
+        self.submitted = 0
+        self.merged = 0
+        self.dropped = 0
+        self.running = False
+
+    def start(self):
+        for stage in self.stages:
+            stage.start()
+        self.running = True
+
+    def submit(self, item):
+        # Appelé depuis le callback audio : ne doit jamais bloquer
+        try:
+            self.stages[0].put(item, block=False)
+        except queue.Full:
+            with self.lock:
+                self.dropped += 1
+            return False
+        with self.lock:
+            self.submitted += 1
+        return True
+
+    def wait_idle(self):
+        # Les étapes sont vidées dans l'ordre : un élément terminé a déjà été transmis à la suivante
+        for stage in self.stages:
+            stage.queue.join()
+
+    def record_merged(self):
+        with self.lock:
+            self.merged += 1
+
+    def stop(self):
+        if not self.running:
+            return
+        self.running = False
+        for stage in self.stages:
+            stage.stop()
+
+    def stats(self):
+        with self.lock:
+            stats = {"submitted": self.submitted, "merged": self.merged, "dropped": self.dropped}
+        for stage in self.stages:
+            stats[stage.name] = stage.stats()
+        return stats
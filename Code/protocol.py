@@ -0,0 +1,161 @@
+import json
+import struct
+from enum import IntEnum
+
+# En-tête : magic, version, type de message, identifiant de requête, longueur du contenu
+MAGIC = b"MK"
+VERSION = 1
+SUPPORTED_VERSIONS = (1,)
+HEADER = struct.Struct(">2sBBII")
+MAX_PAYLOAD_SIZE = 64 * 1024 * 1024
+
+END_OF_MESSAGE = "END_OF_MESSAGE"
+NO_BARKS = "NO_BARKS"
+
+
+class MessageType(IntEnum):
+    HELLO = 0x01
+    STOP = 0x10
+    START = 0x11
+    MANUAL_MESSAGE = 0x12
+    SET_THRESHOLDS = 0x13
+    RELOAD_KNOWN_BARKS = 0x14
+    SUBSCRIBE = 0x15
+    UNSUBSCRIBE = 0x16
+    REQUEST_PARAMETERS = 0x20
+    REQUEST_APP_STATE = 0x21
+    REQUEST_LAST_BARKS = 0x22
+    REQUEST_PIPELINE_STATS = 0x23
+    REQUEST_METRICS = 0x24
+    REQUEST_NOISE_FLOOR = 0x25
+    AUDIO_FILE = 0x30
+    UPLOAD_BEGIN = 0x31  # suivi directement des octets bruts du fichier
+    RESPONSE = 0x40
+    ERROR = 0x41
+    EVENT = 0x42  # envoyé sans requête aux connexions abonnées
+
+
+LEGACY_COMMANDS = {MessageType.RELOAD_KNOWN_BARKS, MessageType.REQUEST_PARAMETERS, MessageType.REQUEST_APP_STATE,
+                   MessageType.REQUEST_LAST_BARKS, MessageType.REQUEST_PIPELINE_STATS, MessageType.REQUEST_METRICS,
+                   MessageType.REQUEST_NOISE_FLOOR, MessageType.SUBSCRIBE, MessageType.UNSUBSCRIBE}
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def is_framed(data):
+    return bytes(data[:len(MAGIC)]) == MAGIC
+
+
+def is_partial_magic(data):
+    # Début possible d'une trame : la lecture suivante dira si le client parle le protocole tramé
+    return len(data) < len(MAGIC) and MAGIC.startswith(bytes(data))
+
+
+def encode_frame(message_type, request_id=0, payload=b"", version=VERSION):
+    if isinstance(payload, str):
+        payload = payload.encode()
+    return HEADER.pack(MAGIC, version, message_type, request_id, len(payload)) + payload
+
+
+class FrameDecoder:
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def feed(self, data):
+        self.buffer += data
+        frames = []
+        while len(self.buffer) >= HEADER.size:
+            magic, version, message_type, request_id, length = HEADER.unpack_from(self.buffer)
+            if magic != MAGIC:
+                raise ProtocolError("Invalid frame header.")
+            if version not in SUPPORTED_VERSIONS:
+                raise ProtocolError(f"Unsupported protocol version {version}.")
+            if length > MAX_PAYLOAD_SIZE:
+                raise ProtocolError(f"Frame too large ({length} bytes).")
+            if len(self.buffer) < HEADER.size + length:
+                break
+            payload = bytes(self.buffer[HEADER.size:HEADER.size + length])
+            del self.buffer[:HEADER.size + length]
+            try:
+                message_type = MessageType(message_type)
+            except ValueError:
+                raise ProtocolError(f"Unknown message type {message_type}.")
+            frames.append((message_type, request_id, payload))
+            if message_type == MessageType.UPLOAD_BEGIN:
+                # La suite du tampon appartient au fichier, pas à une trame
+                break
+        return frames
+
+    def take(self, size):
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return data
+
+
+def decode_thresholds(payload):
+    if isinstance(payload, bytes):
+        payload = payload.decode()
+    payload = payload.strip()
+    if payload.startswith("{"):
+        values = json.loads(payload)
+        values = [values["noise_threshold"], values["resemblance_threshold"], values["cooldown"]]
+    else:
+        values = payload.strip("[]() ").split(",")
+    if len(values) != 3:
+        raise ProtocolError(f"Expected 3 thresholds, got {len(values)}.")
+    try:
+        noise_threshold, resemblance_threshold, cooldown = (float(value) for value in values)
+    except (TypeError, ValueError):
+        raise ProtocolError(f"Invalid thresholds: {payload}")
+    return noise_threshold, resemblance_threshold, cooldown
+
+
+def encode_thresholds(noise_threshold, resemblance_threshold, cooldown):
+    return json.dumps({"noise_threshold": noise_threshold, "resemblance_threshold": resemblance_threshold,
+                       "cooldown": cooldown})
+
+
+def encode_audio_file(sender, file_data):
+    sender = sender.encode()
+    return struct.pack(">H", len(sender)) + sender + file_data
+
+
+def decode_audio_file(payload):
+    (sender_length,) = struct.unpack_from(">H", payload)
+    sender = payload[2:2 + sender_length].decode()
+    return sender, payload[2 + sender_length:]
+
+
+def parse_legacy_command(message):
+    match message:
+        case "0":
+            return MessageType.STOP, b""
+        case "1":
+            return MessageType.START, b""
+        case message if message.startswith("2"):
+            return MessageType.MANUAL_MESSAGE, message.split(" ", maxsplit=1)[1].encode()
+        case message if message.startswith("3"):
+            return MessageType.SET_THRESHOLDS, message.split(" ", maxsplit=1)[1].encode()
+        case message if message in MessageType.__members__ and MessageType[message] in LEGACY_COMMANDS:
+            return MessageType[message], b""
+        case _:
+            return None, b""
+
+
+def encode_event(kind, data):
+    return json.dumps(dict(data, event=kind))
+
+
+def encode_legacy_event(event):
+    return ("EVENT " + event + END_OF_MESSAGE).encode()
+
+
+def encode_legacy_response(text):
+    if isinstance(text, str):
+        text = text.encode()
+    if text == NO_BARKS.encode():
+        return text
+    return text + END_OF_MESSAGE.encode()
@@ -0,0 +1,64 @@
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+from db_requests import get_last_barks
+
+LAST_BARKS_LIMIT = 5
+LAST_BARKS_MAX_AGE = timedelta(days=3)
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+class RecentBarks:
+    # Vue en mémoire des derniers aboiements, chargée une fois depuis la base puis tenue à jour à chaque enregistrement
+
+    def __init__(self, loader=get_last_barks, limit=LAST_BARKS_LIMIT, max_age=LAST_BARKS_MAX_AGE):
+        self.loader = loader
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.barks = deque(maxlen=limit)  # du plus ancien au plus récent
+        self.loaded = False
+        self.version = 0
+
+    def load(self):
+        last_barks = self.loader()
+        if last_barks is False:
+            return False
+        with self.lock:
+            recorded = list(self.barks)
+            self.barks.clear()
+            for bark in sorted(list(last_barks) + recorded, key=lambda bark: bark[0]):
+                self.insert(bark)
+            self.loaded = True
+            self.version += 1
+        return True
+
+    def add(self, bark):
+        date = bark[0] if isinstance(bark[0], datetime) else datetime.strptime(bark[0], TIMESTAMP_FORMAT)
+        with self.lock:
+            self.insert((date, bark[1], bark[2]))
+            self.version += 1
+
+    def insert(self, bark):
+        if bark in self.barks:
+            return
+        if not self.barks or bark[0] >= self.barks[-1][0]:
+            self.barks.append(bark)
+        elif len(self.barks) < self.barks.maxlen or bark[0] > self.barks[0][0]:
+            # Rare : un aboiement plus ancien que le dernier connu, on garde l'ordre chronologique
+            barks = sorted(list(self.barks) + [bark], key=lambda item: item[0])
+            self.barks.clear()
+            self.barks.extend(barks)
+
+    def get(self, now=None):
+        if not self.loaded and not self.load():
+            return False
+        oldest = (now or datetime.now()) - self.max_age
+        with self.lock:
+            return [bark for bark in reversed(self.barks) if bark[0] >= oldest]
+
+    def expires_at(self, now=None):
+        # Date à laquelle le plus ancien aboiement affiché sort de la fenêtre, ce qui change la réponse
+        oldest = (now or datetime.now()) - self.max_age
+        with self.lock:
+            dates = [bark[0] for bark in self.barks if bark[0] >= oldest]
+        return min(dates) + self.max_age if dates else None
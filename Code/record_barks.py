@@ -43,15 +43,14 @@ class BarkListener:
             return
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         file_path = f"./barks/bark_{timestamp}_{self.bark_number}.wav"
-        buffer_path = f"./barks/buffer_{timestamp}_{self.bark_number}.txt"
+        buffer_path = f"./barks/buffer_{timestamp}_{self.bark_number}.npy"
         # Convertir le tampon en numpy array et sauvegarder
-        audio_data = np.array(self.buffer, dtype=np.float32)
-        audio_data = np.int16(audio_data / np.max(np.abs(audio_data)) * 32767)
+        raw_data = np.array(self.buffer, dtype=np.float32)
+        audio_data = np.int16(raw_data / np.max(np.abs(raw_data)) * 32767)
         write(file_path, self.sample_rate, audio_data)
         print(f"Audio saved to {file_path}")
-        # Sauvegarder le tampon pour analyse
-        with open(buffer_path, "w") as f:
-            f.write(str(self.buffer))
+        # Sauvegarder le tampon brut (float32) pour analyse
+        np.save(buffer_path, raw_data)
         self.previous_buffer.extend(self.buffer)
         self.buffer = []  # Réinitialiser le tampon
         self.bark_number += 1
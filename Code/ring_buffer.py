@@ -0,0 +1,40 @@
+import numpy as np
+
+
+class RingBuffer:
+    # Les données sont écrites deux fois (data[i] et data[i + capacity]) pour que
+    # toute fenêtre de taille <= capacity soit une vue contiguë, sans copie.
+
+    def __init__(self, capacity, dtype=np.float32):
+        self.capacity = capacity
+        self.data = np.zeros(2 * capacity, dtype=dtype)
+        self.position = 0  # nombre total d'échantillons écrits
+
+    def write(self, samples):
+        n = len(samples)
+        if n > self.capacity:
+            samples = samples[-self.capacity:]
+            self.position += n - self.capacity
+            n = self.capacity
+        start = self.position % self.capacity
+        first = min(n, self.capacity - start)
+        self.data[start:start + first] = samples[:first]
+        self.data[start + self.capacity:start + self.capacity + first] = samples[:first]
+        rest = n - first
+        if rest:
+            self.data[:rest] = samples[first:]
+            self.data[self.capacity:self.capacity + rest] = samples[first:]
+        self.position += n
+
+    def oldest_position(self):
+        return max(0, self.position - self.capacity)
+
+    def is_available(self, start, end):
+        return self.oldest_position() <= start <= end <= self.position
+
+    def window(self, start, end):
+        start = max(start, self.oldest_position())
+        if not self.is_available(start, end):
+            raise ValueError(f"Samples [{start}, {end}) are no longer in the buffer (position {self.position}).")
+        offset = start % self.capacity
+        return self.data[offset:offset + end - start]
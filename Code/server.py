@@ -1,31 +1,88 @@
 import socket
-from BarkDetector import BarkDetector
-from datetime import datetime
+import json
 import os
+import sys
 import threading
-from db_requests import get_parameters, modify_parameters, get_last_barks
-import sounddevice as sd
-from BarkDetector import SAMPLE_RATE
+import time
+from datetime import datetime
+from db_requests import get_parameters, modify_parameters, parameters_listeners
+from bark_events import get_event_log, close_event_log
+from recent_barks import RecentBarks
+from subscriptions import SubscriberHub, Subscription
+from metrics import registry, start_http_server
+from protocol import (MessageType, ProtocolError, FrameDecoder, VERSION, NO_BARKS, is_framed, is_partial_magic,
+                      encode_frame, decode_thresholds, decode_audio_file, parse_legacy_command, encode_legacy_response)
+from uploads import (AudioUpload, UploadError, receive_upload, parse_upload_header, parse_upload_metadata,
+                     split_upload_header, find_end_of_file)
 import locale
 
 
 locale.setlocale(locale.LC_TIME, 'fr_FR.UTF-8')
 
 
+class DetectorUnavailable(Exception):
+    pass
+
+
+class DatabaseUnavailable(Exception):
+    pass
+
+
+class SocketClient:
+    # Les réponses et les événements poussés aux abonnés partagent le socket : un envoi complet à la fois
+
+    def __init__(self, client_socket):
+        self.socket = client_socket
+        self.lock = threading.Lock()
+
+    def send(self, data):
+        with self.lock:
+            self.socket.sendall(data)
+        return len(data)
+
+    def __getattr__(self, name):
+        return getattr(self.socket, name)
+
+
+def create_bark_detector():
+    # numpy, modèles et sons ne sont chargés qu'une fois le port ouvert
+    from BarkDetector import BarkDetector
+    archive = os.getenv("CAPTURE_ARCHIVE")
+    if archive:
+        from capture_archive import CaptureArchive
+        return BarkDetector(archive=CaptureArchive(archive))
+    return BarkDetector()
+
+
 class Server:
 
     def __init__(self, bark_detector):
-        self.bark_detector = bark_detector
+        # Un détecteur déjà construit, ou une fonction qui le construit après l'ouverture du port
+        self.detector_factory = bark_detector if callable(bark_detector) else None
+        self._bark_detector = None if callable(bark_detector) else bark_detector
+        self.detector_ready = threading.Event()
+        self.detector_error = None  # raison de l'échec du chargement, renvoyée aux clients
         self.connections = []
         self.current_instance = None
         self.stop_event = threading.Event()
+        # Réponses déjà encodées, invalidées à chaque écriture : les interrogations répétées ne touchent pas la base
+        self.responses = {}
+        self.responses_lock = threading.Lock()
+        self.recent_barks = RecentBarks()
+        self.subscribers = SubscriberHub(self.create_subscription)
+        get_event_log().listeners.append(self.bark_recorded)
+        parameters_listeners.append(self.parameters_changed)
+        registry.register_collector("pipeline", lambda: self.bark_detector.pipeline_stats())
+        registry.register_collector("noise_floor", lambda: self.bark_detector.noise_floor.stats())
         self.start()
 
     def start(self):
         server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         server_socket.bind(('', 8081))  # Port 8081 utilisé
         server_socket.listen(5)
         print("Server is listening on port 8081")
+        self.load_detector_async()
 
         while True:
             try:
@@ -40,108 +97,290 @@ class Server:
         for connection in self.connections:
             connection.close()
         server_socket.close()
+        if self._bark_detector is not None:
+            self._bark_detector.close()
+        close_event_log()
+
+    def create_subscription(self, client, request_id):
+        return Subscription(client, request_id)
+
+    @property
+    def bark_detector(self):
+        # Les commandes reçues pendant le démarrage attendent que le détecteur soit prêt
+        self.detector_ready.wait()
+        if self._bark_detector is None:
+            raise DetectorUnavailable(f"Bark detector unavailable: {self.detector_error}")
+        return self._bark_detector
+
+    def load_detector_async(self):
+        threading.Thread(target=self.load_detector, name="detector-loader", daemon=True).start()
+
+    def load_detector(self):
+        start = time.perf_counter()
+        try:
+            if self.detector_factory is not None:
+                self._bark_detector = self.detector_factory()
+            self._bark_detector.reload_config()
+            print(f"Bark detector ready in {time.perf_counter() - start:.2f} s")
+        except Exception as e:
+            self._bark_detector = None
+            self.detector_error = e
+            print(f"Could not start the bark detector: {e}")
+        finally:
+            self.detector_ready.set()
 
     def handle_client(self, client_socket):
+        client = SocketClient(client_socket)
         try:
-            while True:
-                # Lire la commande ou le type de données
-                try:
-                    header = client_socket.recv(1024).decode()
-                    if not header:
-                        break
-                    print(header)
-                    if header == "AUDIO_FILE":
-                        self.receive_file(client_socket)
-                    else:
-                        self.process(header, client_socket)
-                except ConnectionResetError:
-                    print("Connection reset by peer")
-                    break
-                except Exception as e:
-                    print(f"Error: {e}")
+            data = client.recv(1024)
+            while data and is_partial_magic(data):
+                more = client.recv(1024)
+                if not more:
                     break
+                data += more
+            if is_framed(data):
+                self.handle_framed_client(client, data)
+            else:
+                self.handle_legacy_client(client, data)
+        except ConnectionResetError:
+            print("Connection reset by peer")
+        except Exception as e:
+            print(f"Error: {e}")
         finally:
             print("Connection closed.")
+            self.subscribers.unsubscribe(client)
             self.connections.remove(client_socket)
             client_socket.close()
 
-    def receive_file(self, client_socket):
-        file_data = b''
-        while True:
+    def handle_legacy_client(self, client_socket, data):
+        while data:
+            # Lire la commande ou le type de données
+            if data.startswith(b"AUDIO_FILE "):
+                # Une commande envoyée juste après le fichier peut être arrivée dans la même lecture
+                data = self.receive_declared_file(client_socket, data) or client_socket.recv(1024)
+                continue
+            header = data.decode()
+            print(header)
+            if header == "AUDIO_FILE":
+                self.receive_file(client_socket)
+            else:
+                self.process(header, client_socket)
             data = client_socket.recv(1024)
+
+    def handle_framed_client(self, client_socket, data):
+        decoder = FrameDecoder()
+        while data:
+            try:
+                frames = decoder.feed(data)
+            except ProtocolError as e:
+                client_socket.send(encode_frame(MessageType.ERROR, 0, str(e)))
+                return
+            while frames:
+                for message_type, request_id, payload in frames:
+                    if message_type == MessageType.UPLOAD_BEGIN:
+                        self.receive_framed_upload(client_socket, decoder, request_id, payload)
+                    else:
+                        self.process_frame(message_type, request_id, payload, client_socket)
+                # Des trames peuvent suivre le fichier dans le tampon
+                frames = decoder.feed(b"")
+            data = client_socket.recv(65536)
+
+    def receive_file(self, client_socket):
+        # Ancien format : contenu terminé par END_OF_FILE_<expéditeur>
+        file_data = bytearray()
+        sender = None
+        searched = 0
+        while sender is None:
+            data = client_socket.recv(65536)
             if not data:
-                break
-            if b'END_OF_FILE' in data:
-                file_data += data.split(b'END_OF_FILE')[0]
-                sender = data.split(b'END_OF_FILE_')[1].decode()
-                break
+                print("Upload interrupted before END_OF_FILE.")
+                return
             file_data += data
+            index = find_end_of_file(file_data, searched)
+            searched = len(file_data)
+            if index != -1:
+                sender = file_data[index:].split(b'END_OF_FILE_', 1)[1].decode()
+                del file_data[index:]
+        self.save_audio_file(file_data, sender)
+
+    def receive_declared_file(self, client_socket, data):
+        parts = split_upload_header(data)
+        while parts is None:  # en-tête coupé entre deux lectures
+            more = client_socket.recv(1024)
+            if not more:
+                raise UploadError("Connection closed before the end of the upload header.")
+            data += more
+            parts = split_upload_header(data)
+        header, initial = parts
+        sender, size, checksum = parse_upload_header(header)
+        upload = AudioUpload(sender, size, checksum)
+        file_name = receive_upload(client_socket, upload, initial[:size])
+        self.audio_file_received(sender, file_name)
+        return initial[size:]
+
+    def receive_framed_upload(self, client_socket, decoder, request_id, payload):
+        try:
+            sender, size, checksum = parse_upload_metadata(payload)
+            upload = AudioUpload(sender, size, checksum)
+        except (UploadError, ValueError, KeyError) as e:
+            # Le client n'enverra pas de fichier accepté : on ferme la connexion
+            client_socket.send(encode_frame(MessageType.ERROR, request_id, str(e)))
+            raise
+        try:
+            file_name = receive_upload(client_socket, upload, decoder.take(size))
+        except UploadError as e:
+            client_socket.send(encode_frame(MessageType.ERROR, request_id, str(e)))
+            raise
+        self.audio_file_received(sender, file_name)
+        client_socket.send(encode_frame(MessageType.RESPONSE, request_id, os.path.basename(file_name)))
 
-        path = f'./audio/{sender}'
-        os.makedirs(path, exist_ok=True)
+    def save_audio_file(self, file_data, sender):
+        upload = AudioUpload(sender, len(file_data))
+        upload.write(file_data)
+        self.audio_file_received(sender, upload.finish())
 
+    def audio_file_received(self, sender, file_name):
         print(f"File received from {sender}")
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        file_name = f'./audio/{sender}/audio_{timestamp}.m4a'
-        with open(file_name, 'wb') as f:
-            f.write(file_data)
         print(f"File received and saved as '{file_name}'")
-        self.bark_detector.update_audio_files()
+        try:
+            bark_detector = self.bark_detector
+        except DetectorUnavailable as e:
+            print(e)  # le fichier est dans ./audio : il sera listé au prochain démarrage du détecteur
+            return
+        bark_detector.add_audio_file(sender, file_name)
 
     def process(self, message, client):
         print(f"Received message: {message}")
-        match message:
-            case "0":  # éteindre le programme
+        message_type, payload = parse_legacy_command(message)
+        if message_type is None:
+            print("Unhandled message.")
+            return
+        if message_type == MessageType.SUBSCRIBE:
+            self.subscribers.subscribe(client)
+            response = "SUBSCRIBED"
+        elif message_type == MessageType.UNSUBSCRIBE:
+            self.subscribers.unsubscribe(client)
+            response = "UNSUBSCRIBED"
+        else:
+            try:
+                response = self.execute(message_type, payload)
+            except (DetectorUnavailable, DatabaseUnavailable) as e:
+                response = f"ERROR {e}"
+        if response is not None:
+            client.send(encode_legacy_response(response))
+
+    def process_frame(self, message_type, request_id, payload, client):
+        print(f"Received frame: {message_type.name} ({request_id})")
+        try:
+            match message_type:
+                case MessageType.HELLO:
+                    client.send(encode_frame(MessageType.HELLO, request_id, json.dumps({"version": VERSION})))
+                    return
+                case MessageType.SUBSCRIBE:
+                    # Les événements porteront l'identifiant de cette requête
+                    self.subscribers.subscribe(client, request_id)
+                    response = None
+                case MessageType.UNSUBSCRIBE:
+                    self.subscribers.unsubscribe(client)
+                    response = None
+                case MessageType.AUDIO_FILE:
+                    sender, file_data = decode_audio_file(payload)
+                    self.save_audio_file(file_data, sender)
+                    response = None
+                case _:
+                    response = self.execute(message_type, payload)
+        except Exception as e:
+            # Une requête qui échoue ne doit pas fermer la connexion ni perdre les requêtes suivantes
+            print(f"Error: {e}")
+            client.send(encode_frame(MessageType.ERROR, request_id, str(e) or type(e).__name__))
+            return
+        client.send(encode_frame(MessageType.RESPONSE, request_id, response or ""))
+
+    def execute(self, message_type, payload):
+        match message_type:
+            case MessageType.STOP:  # éteindre le programme
                 self.stop_program()
-            case "1":  # allumer le programme
+            case MessageType.START:  # allumer le programme
                 self.start_program()
-            case message if message.startswith("2"):
-                received_voice = str(message.split(" ", maxsplit=1)[1])
+            case MessageType.MANUAL_MESSAGE:
+                received_voice = payload.decode()
                 self.bark_detector.manual_message(received_voice)
-            case message if message.startswith("3"):
-                received_thresholds = eval(message.split(" ", maxsplit=1)[1])
-                new_db_threshold = received_thresholds[0]
-                new_resemblance_threshold = received_thresholds[1]
-                new_cooldown = received_thresholds[2]
+            case MessageType.SET_THRESHOLDS:
+                new_db_threshold, new_resemblance_threshold, new_cooldown = decode_thresholds(payload)
                 self.bark_detector.set_thresholds(new_db_threshold, new_resemblance_threshold, new_cooldown)
                 modify_parameters([("noise_threshold", new_db_threshold), ("resemblance_threshold", new_resemblance_threshold), ("cooldown", new_cooldown)])
-            case "REQUEST_PARAMETERS":
-                parameters = get_parameters()
-                parameters = self.format_parameters(parameters)
-                parameters = str(parameters) + "END_OF_MESSAGE"
-                print(parameters)
-                client.send(parameters.encode())
-            case "REQUEST_APP_STATE":
-                if self.current_instance is None:
-                    message = "0"
-                else:
-                    message = "1"
-                message += "END_OF_MESSAGE"
-                client.send(message.encode())
-            case "REQUEST_LAST_BARKS":
-                last_barks = get_last_barks()
-                print(f"{last_barks = }")
-                if last_barks:
-                    last_barks = self.format_last_barks(last_barks)
-                    last_barks = str(last_barks) + "END_OF_MESSAGE"
-                else:
-                    last_barks = "NO_BARKS"
-                client.send(last_barks.encode())
+            case MessageType.RELOAD_KNOWN_BARKS:
+                self.bark_detector.reload_known_barks()
+            case MessageType.REQUEST_PIPELINE_STATS:
+                return json.dumps(self.bark_detector.pipeline_stats())
+            case MessageType.REQUEST_METRICS:
+                return registry.to_json()
+            case MessageType.REQUEST_NOISE_FLOOR:
+                return json.dumps(self.bark_detector.noise_floor.stats())
+            case MessageType.REQUEST_PARAMETERS:
+                return self.cached_response(MessageType.REQUEST_PARAMETERS, self.build_parameters)
+            case MessageType.REQUEST_APP_STATE:
+                return "0" if self.current_instance is None else "1"
+            case MessageType.REQUEST_LAST_BARKS:
+                return self.cached_response(MessageType.REQUEST_LAST_BARKS, self.build_last_barks)
             case _:
-                print("Unhandled message.")
+                raise ProtocolError(f"Unexpected message type {message_type.name}.")
+        return None
+
+    def cached_response(self, key, build):
+        with self.responses_lock:
+            payload, valid_until = self.responses.get(key, (None, None))
+        if payload is not None and (valid_until is None or datetime.now() < valid_until):
+            return payload
+        payload, valid_until = build()
+        with self.responses_lock:
+            self.responses[key] = (payload, valid_until)
+        return payload
+
+    def invalidate_response(self, key):
+        with self.responses_lock:
+            self.responses.pop(key, None)
+
+    def bark_recorded(self, bark):
+        self.recent_barks.add(bark)
+        self.invalidate_response(MessageType.REQUEST_LAST_BARKS)
+        self.subscribers.publish("bark", {"date": bark[0], "mode": bark[1], "voice": bark[2],
+                                          "source": bark[3] if len(bark) > 3 else None})
+
+    def parameters_changed(self):
+        self.invalidate_response(MessageType.REQUEST_PARAMETERS)
+        if len(self.subscribers):
+            parameters = get_parameters()
+            if parameters is not False:
+                self.subscribers.publish("parameters", {param[1]: param[2] for param in parameters})
+
+    def build_parameters(self):
+        parameters = get_parameters()
+        if parameters is False:
+            raise DatabaseUnavailable("Could not load parameters.")
+        parameters = self.format_parameters(parameters)
+        print(parameters)
+        return parameters.encode(), None
+
+    def build_last_barks(self):
+        last_barks = self.recent_barks.get()
+        print(f"{last_barks = }")
+        if last_barks is False:
+            # Réponse de l'ancien serveur, déjà périmée : la base est réinterrogée à la requête suivante
+            return NO_BARKS.encode(), datetime.now()
+        # La réponse change aussi quand le plus ancien aboiement sort de la fenêtre de 3 jours
+        valid_until = self.recent_barks.expires_at()
+        if not last_barks:
+            return NO_BARKS.encode(), valid_until
+        return self.format_last_barks(last_barks).encode(), valid_until
 
     def format_parameters(self, parameters):
-        formatted_parameters = ""
-        for param in parameters:
-            formatted_parameters += f"{param[1]}:{param[2]}, "
-        return formatted_parameters[:-2]
+        return ", ".join(f"{param[1]}:{param[2]}" for param in parameters)
 
     def format_last_barks(self, last_barks):
-        formatted_barks = ""
         translate_mode = {"Automatic": "Automatique", "Manual": "Manuel", "Not handled": "Non traité"}
-        for bark in last_barks:
-            formatted_barks += f"{self.format_timestamp(bark[0])};{translate_mode[str(bark[1]).capitalize()]};{bark[2]}? "
-        return formatted_barks[:-2]
+        return "? ".join(f"{self.format_timestamp(bark[0])};{translate_mode[str(bark[1]).capitalize()]};{bark[2]}"
+                         for bark in last_barks)
 
     def format_timestamp(self, timestamp):
         # Formater la date et l'heure
@@ -150,11 +389,15 @@ class Server:
 
     def start_program(self):
         if not self.current_instance:
-            self.bark_detector = BarkDetector()
+            # Le même détecteur est réutilisé : modèles, sons et réglages restent chargés
+            self.bark_detector.reset()
             self.current_instance = threading.Thread(target=self.start_detection, args=(self.bark_detector,))
             self.current_instance.start()
+            self.subscribers.publish("mode", {"state": "1"})
 
-    def start_detection(self, bark_detector: BarkDetector):
+    def start_detection(self, bark_detector):
+        import sounddevice as sd  # PortAudio n'est initialisé qu'au premier démarrage de la détection
+        from spectral import SAMPLE_RATE
         try:
             with sd.InputStream(callback=bark_detector.detect_bark, channels=1, device=1, samplerate=SAMPLE_RATE):
                 print("Enregistrement en cours. Appuyez sur Ctrl+C pour arrêter.")
@@ -168,11 +411,20 @@ class Server:
             print("Détection déjà en cours")
 
     def stop_program(self):
+        if not self.current_instance:
+            return  # détection déjà arrêtée
         self.stop_event.set()
         self.current_instance.join()  # Attendre que le thread se termine
         self.current_instance = None
         self.stop_event.clear()
+        self.subscribers.publish("mode", {"state": "0"})
 
 
 if __name__ == "__main__":
-    server = Server(BarkDetector())
+    if os.getenv("METRICS_PORT"):
+        start_http_server(int(os.getenv("METRICS_PORT")))
+    if "--async" in sys.argv:
+        from async_server import AsyncServer
+        server = AsyncServer(create_bark_detector)
+    else:
+        server = Server(create_bark_detector)
@@ -1,5 +1,6 @@
 import random
 import numpy as np
+from spectral import threshold_bins
 
 
 def generate_random_sine_wave(signal_span):
@@ -30,11 +31,5 @@ def reconstruct_signal_based_on_harmonics(signal_fft_power, signal_span):
     return reconstructed_signal
 
 def get_highest_harmonics(power, threshold_ratio=0.1):
-    harmonics = []
-    max_amplitude = np.max(power)
-    power_normalized = power / max_amplitude
-    max_pwr = np.max(power_normalized)
-    for i in range(1, len(power_normalized) // 2):
-        if power_normalized[i] > threshold_ratio * max_pwr:
-            harmonics.append((i, power[i]))
-    return harmonics
\ No newline at end of file
+    bins, _ = threshold_bins(power, threshold_ratio, len(power) // 2)
+    return list(zip(bins, power[bins]))
@@ -1,4 +1,8 @@
+import hashlib
+import json
 import socket
+from protocol import MessageType, FrameDecoder, encode_frame, parse_legacy_command, decode_thresholds, encode_thresholds
+from uploads import encode_upload_metadata
 
 def connect_to_server(host, port):
     client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -10,19 +14,39 @@ def connect_to_server(host, port):
         return None
     return client_socket
 
-def send_message(client_socket, message):
+def send_frame(client_socket, message_type, request_id, payload=b""):
     try:
-        client_socket.sendall(message.encode())
-        print(f"Sent: {message}")
+        client_socket.sendall(encode_frame(message_type, request_id, payload))
+        print(f"Sent: {message_type.name} ({request_id})")
     except socket.error as e:
         print(f"Failed to send message: {e}")
 
-def receive_response(client_socket):
+def receive_frame(client_socket, decoder):
+    frames = []
     try:
-        response = client_socket.recv(1024)
-        print(f"Received: {response.decode()}")
+        while not frames:
+            data = client_socket.recv(65536)
+            if not data:
+                return None
+            frames = decoder.feed(data)
     except socket.error as e:
         print(f"Failed to receive response: {e}")
+        return None
+    for message_type, request_id, payload in frames:
+        print(f"Received: {message_type.name} ({request_id}) {payload.decode()}")
+    return frames
+
+def upload_file(client_socket, request_id, sender, file_path):
+    with open(file_path, "rb") as f:
+        file_data = f.read()
+    metadata = encode_upload_metadata(sender, len(file_data), hashlib.sha256(file_data).hexdigest())
+    send_frame(client_socket, MessageType.UPLOAD_BEGIN, request_id, metadata)
+    client_socket.sendall(file_data)
+
+def negotiate(client_socket, decoder):
+    send_frame(client_socket, MessageType.HELLO, 0, json.dumps({"versions": [1]}))
+    frames = receive_frame(client_socket, decoder)
+    return bool(frames) and frames[0][0] == MessageType.HELLO
 
 def main():
     host = "192.168.129.17"
@@ -32,12 +56,44 @@ def main():
     if not client_socket:
         return
 
+    decoder = FrameDecoder()
+    if not negotiate(client_socket, decoder):
+        print("Protocol negotiation failed")
+        client_socket.close()
+        return
+
+    request_id = 1
     while True:
         message = input("Enter message to send (or 'exit' to quit): ")
         if message.lower() == 'exit':
             break
-        send_message(client_socket, message)
-        #receive_response(client_socket)
+        if message.startswith("upload "):
+            # upload <expéditeur> <chemin du fichier>
+            _, sender, file_path = message.split(" ", maxsplit=2)
+            upload_file(client_socket, request_id, sender, file_path)
+            receive_frame(client_socket, decoder)
+            request_id += 1
+            continue
+        if message == "listen":
+            # Affiche les événements poussés par le serveur jusqu'à Ctrl+C
+            send_frame(client_socket, MessageType.SUBSCRIBE, request_id)
+            try:
+                while receive_frame(client_socket, decoder):
+                    pass
+            except KeyboardInterrupt:
+                send_frame(client_socket, MessageType.UNSUBSCRIBE, request_id + 1)
+                receive_frame(client_socket, decoder)
+            request_id += 2
+            continue
+        message_type, payload = parse_legacy_command(message)
+        if message_type is None:
+            print("Unknown command")
+            continue
+        if message_type == MessageType.SET_THRESHOLDS:
+            payload = encode_thresholds(*decode_thresholds(payload))
+        send_frame(client_socket, message_type, request_id, payload)
+        receive_frame(client_socket, decoder)
+        request_id += 1
 
     client_socket.close()
     print("Connection closed")
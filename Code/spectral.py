@@ -0,0 +1,39 @@
+from functools import lru_cache
+import numpy as np
+
+SAMPLE_RATE = 44100
+HARMONIC_THRESHOLD_RATIO = 0.6
+
+
+@lru_cache(maxsize=None)
+def get_window(name, size):
+    if name is None or name == "rectangular":
+        return None
+    if name == "hann":
+        window = np.hanning(size)
+    elif name == "hamming":
+        window = np.hamming(size)
+    elif name == "blackman":
+        window = np.blackman(size)
+    else:
+        raise ValueError(f"Unknown window: {name}")
+    window = window.astype(np.float32)
+    window.flags.writeable = False
+    return window
+
+
+@lru_cache(maxsize=None)
+def bin_frequencies(size, sample_rate=SAMPLE_RATE):
+    frequencies = np.fft.rfftfreq(size, 1 / sample_rate)
+    frequencies.flags.writeable = False
+    return frequencies
+
+
+def threshold_bins(power, threshold_ratio, stop=None):
+    stop = len(power) - 1 if stop is None else stop
+    max_amplitude = np.max(power)
+    if max_amplitude <= 0:
+        return np.empty(0, dtype=int), np.empty(0)
+    power_normalized = power[1:stop] / max_amplitude
+    bins = np.flatnonzero(power_normalized > threshold_ratio) + 1
+    return bins, power_normalized[bins - 1]
@@ -0,0 +1,127 @@
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from dotenv import load_dotenv
+
+POOL_WAIT_TIMEOUT = 5
+SQLITE_PATH = "./database/mokadb.sqlite3"
+SQLITE_SCHEMA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "database", "sqlite_initialization.sql")
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Les colonnes déclarées "timestamp" sont relues en datetime, comme avec MySQL
+sqlite3.register_converter("timestamp", lambda value: datetime.strptime(value.decode(), TIMESTAMP_FORMAT))
+
+
+class MySQLBackend:
+    name = "mysql"
+
+    def __init__(self, user, password, host, database, port, pool_size=5):
+        # Importé seulement si MySQL est utilisé : SQLite suffit pour tourner hors ligne
+        import mysql.connector
+        from mysql.connector import pooling
+        self.Error = mysql.connector.Error
+        self.InvalidData = (mysql.connector.IntegrityError, mysql.connector.DataError)  # la ligne, pas la connexion
+        self.PoolError = pooling.PoolError
+        # Pool de connexions partagé par le serveur et le détecteur
+        self.pool = pooling.MySQLConnectionPool(pool_name="mokadb", pool_size=pool_size, pool_reset_session=False,
+                                                user=user, password=password, host=host, database=database, port=port)
+
+    def get_connection(self):
+        deadline = time.monotonic() + POOL_WAIT_TIMEOUT
+        while True:
+            try:
+                cnx = self.pool.get_connection()
+                break
+            except self.PoolError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.01)
+        try:
+            cnx.ping(reconnect=True, attempts=2, delay=0)
+        except self.Error:
+            cnx.close()
+            raise
+        return cnx
+
+    def connect(self, prepared=False):
+        cnx = self.get_connection()
+        return cnx, cnx.cursor(prepared=prepared)
+
+    def sql(self, query):
+        return query
+
+
+class SQLiteConnection:
+    # La connexion du thread reste ouverte : close() annule seulement une transaction laissée en cours
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def cursor(self):
+        return self.connection.cursor()
+
+    def commit(self):
+        self.connection.commit()
+
+    def rollback(self):
+        self.connection.rollback()
+
+    def close(self):
+        if self.connection.in_transaction:
+            self.connection.rollback()
+
+
+class SQLiteBackend:
+    name = "sqlite"
+    Error = sqlite3.Error
+    InvalidData = (sqlite3.IntegrityError, sqlite3.DataError)
+
+    def __init__(self, path=SQLITE_PATH):
+        self.path = path
+        self.local = threading.local()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(SQLITE_SCHEMA, encoding="utf-8") as f:
+            self.open().executescript(f.read())
+
+    def open(self):
+        connection = sqlite3.connect(self.path, timeout=POOL_WAIT_TIMEOUT, detect_types=sqlite3.PARSE_DECLTYPES)
+        connection.execute("PRAGMA journal_mode=WAL")  # les lectures ne sont pas bloquées par l'écriture en cours
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def connect(self, prepared=False):
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            connection = self.local.connection = self.open()
+        cnx = SQLiteConnection(connection)
+        return cnx, cnx.cursor()
+
+    def sql(self, query):
+        return query.replace("%s", "?")
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            load_dotenv()
+            if os.getenv('DB_BACKEND', 'mysql').lower() == 'sqlite':
+                _backend = SQLiteBackend(os.getenv('DB_PATH', SQLITE_PATH))
+            else:
+                _backend = MySQLBackend(os.getenv('DB_USER'), os.getenv('DB_PASSWORD'), os.getenv('DB_HOST'),
+                                        os.getenv('DB_NAME'), os.getenv('DB_PORT'), int(os.getenv('DB_POOL_SIZE', 5)))
+            print(f"Using {_backend.name} storage.")
+    return _backend
+
+
+def set_backend(backend):
+    global _backend
+    with _backend_lock:
+        _backend = backend
@@ -0,0 +1,81 @@
+import queue
+import threading
+from metrics import counter
+from protocol import MessageType, encode_frame, encode_event, encode_legacy_event
+
+MAX_PENDING_EVENTS = 32  # au-delà, un abonné trop lent perd des événements
+
+dropped_events = counter("dropped_events")
+
+
+def encode_pushed_event(event, request_id=None):
+    if request_id is None:  # ancien protocole texte
+        return encode_legacy_event(event)
+    return encode_frame(MessageType.EVENT, request_id, event)
+
+
+class Subscription:
+    # Une file et un thread par abonné : un client lent ne retarde ni le détecteur ni les autres abonnés
+
+    def __init__(self, client, request_id=None):
+        self.client = client
+        self.request_id = request_id  # None pour l'ancien protocole texte
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self.run, name="subscription", daemon=True)
+        self.thread.start()
+
+    def push(self, event):
+        if self.queue.qsize() >= MAX_PENDING_EVENTS:
+            dropped_events.inc()
+            return
+        self.queue.put(event)
+
+    def run(self):
+        while True:
+            event = self.queue.get()
+            if event is None:
+                break
+            try:
+                self.client.send(encode_pushed_event(event, self.request_id))
+            except OSError as e:
+                print(f"Could not push event to subscriber: {e}")
+                break
+
+    def close(self):
+        self.queue.put(None)
+
+
+class SubscriberHub:
+
+    def __init__(self, create_subscription=Subscription):
+        self.create_subscription = create_subscription  # (client, request_id) -> objet avec push() et close()
+        self.lock = threading.Lock()
+        self.subscriptions = {}
+
+    def subscribe(self, client, request_id=None):
+        subscription = self.create_subscription(client, request_id)
+        with self.lock:
+            previous = self.subscriptions.pop(client, None)
+            self.subscriptions[client] = subscription
+        if previous is not None:
+            previous.close()
+
+    def unsubscribe(self, client):
+        with self.lock:
+            subscription = self.subscriptions.pop(client, None)
+        if subscription is not None:
+            subscription.close()
+
+    def publish(self, kind, data):
+        # Encodé une seule fois pour tous les abonnés
+        event = encode_event(kind, data)
+        with self.lock:
+            subscriptions = list(self.subscriptions.values())
+        for subscription in subscriptions:
+            subscription.push(event)
+
+    def __contains__(self, client):
+        return client in self.subscriptions
+
+    def __len__(self):
+        return len(self.subscriptions)
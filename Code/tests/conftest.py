@@ -0,0 +1,16 @@
+import os
+import sys
+import pytest
+
+# Les modules de Code/ s'importent à plat, comme quand les scripts sont lancés depuis ce dossier
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import SQLiteBackend, set_backend
+
+
+@pytest.fixture
+def sqlite_backend(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / "mokadb.sqlite3"))
+    set_backend(backend)
+    yield backend
+    set_backend(None)
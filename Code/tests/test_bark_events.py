@@ -0,0 +1,54 @@
+import json
+from datetime import datetime
+from bark_events import BarkEventLog
+from db_requests import insert_barks, get_last_barks
+
+
+class FlakyWriter:
+    # Base injoignable tant que available est faux
+
+    def __init__(self):
+        self.available = False
+        self.written = []
+
+    def __call__(self, barks, rejected=None):
+        if not self.available:
+            return False
+        self.written.extend(barks)
+        return True
+
+
+def read_lines(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_events_are_spooled_then_replayed(tmp_path):
+    writer = FlakyWriter()
+    spool_path = tmp_path / "spool" / "barks.jsonl"
+    log = BarkEventLog(writer, str(spool_path), flush_interval=0.05, rejected_path=str(tmp_path / "rejected.jsonl"))
+    log.record(["2024-05-10 10:00:00", "Automatic", "Papa"])
+    log.close()
+    assert read_lines(spool_path) == [["2024-05-10 10:00:00", "Automatic", "Papa"]]
+
+    writer.available = True
+    log = BarkEventLog(writer, str(spool_path), flush_interval=0.05, rejected_path=str(tmp_path / "rejected.jsonl"))
+    log.record(["2024-05-10 10:01:00", "Manual", "Maman"])
+    log.close()
+    assert writer.written == [["2024-05-10 10:00:00", "Automatic", "Papa"], ["2024-05-10 10:01:00", "Manual", "Maman"]]
+    assert not spool_path.exists()
+
+
+def test_invalid_spooled_event_does_not_block_the_spool(sqlite_backend, tmp_path):
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    spool_path = tmp_path / "spool" / "barks.jsonl"
+    rejected_path = tmp_path / "spool" / "rejected.jsonl"
+    spool_path.parent.mkdir()
+    spool_path.write_text(json.dumps([now, "Manual", "2 Bogus"]) + "\n")
+    log = BarkEventLog(insert_barks, str(spool_path), flush_interval=0.05, rejected_path=str(rejected_path))
+    log.record([now, "Manual", "Papa"])
+    log.record([now, "Automatic", "Maman"])
+    log.close()
+    assert sorted(bark[2] for bark in get_last_barks()) == ["Maman", "Papa"]
+    assert not spool_path.exists()
+    assert read_lines(rejected_path) == [[now, "Manual", "2 Bogus"]]
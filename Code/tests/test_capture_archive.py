@@ -0,0 +1,43 @@
+import numpy as np
+from capture_archive import CaptureArchive
+
+
+def capture(value, length=8):
+    return np.full(length, value, dtype=np.float32)
+
+
+def test_oldest_slots_are_reused(tmp_path):
+    archive = CaptureArchive(str(tmp_path), slots=3, slot_samples=8)
+    entries = []
+    for i in range(5):
+        archive.record(capture(i), timestamp=100.0 + i, bark_id=i if i % 2 else None, score=0.5)
+        entries.append(archive.entries()[-1])
+    assert len(archive) == 3
+    assert list(archive.entries()["sequence"]) == [2, 3, 4]
+    # Les captures 0 et 1 ont été écrasées par 3 et 4
+    assert archive.clip(entries[0]) is None and not archive.is_current(entries[1])
+    np.testing.assert_array_equal(archive.clip(entries[4]), capture(4))
+    assert list(archive.entries(matched=True)["bark_id"]) == [3]
+    assert list(archive.entries(matched=False)["sequence"]) == [2, 4]
+
+
+def test_long_capture_is_truncated_to_the_slot(tmp_path):
+    archive = CaptureArchive(str(tmp_path), slots=2, slot_samples=8)
+    archive.record(np.arange(20, dtype=np.float32), timestamp=0.0)
+    entry = archive.entries()[0]
+    assert entry["length"] == 8
+    np.testing.assert_array_equal(archive.clip(entry), np.arange(8))
+
+
+def test_reopened_archive_continues_the_sequence(tmp_path):
+    archive = CaptureArchive(str(tmp_path), slots=2, slot_samples=8)
+    archive.record(capture(1), timestamp=0.0)
+    archive.record(capture(2), timestamp=1.0)
+    archive.close()
+    reader = CaptureArchive(str(tmp_path), readonly=True)
+    archive = CaptureArchive(str(tmp_path))
+    assert archive.record(capture(3), timestamp=2.0) == 2
+    archive.close()
+    # Le lecteur voit la nouvelle capture à la place de la plus ancienne
+    assert list(reader.entries()["sequence"]) == [1, 2]
+    np.testing.assert_array_equal(reader.clip(reader.entries()[-1]), capture(3))
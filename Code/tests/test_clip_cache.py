@@ -0,0 +1,55 @@
+from clip_cache import ClipCache
+
+
+class Clip:
+
+    def __init__(self, size):
+        self.raw_data = bytes(size)
+
+
+class CountingDecoder:
+
+    def __init__(self, sizes):
+        self.sizes = sizes
+        self.decoded = []
+
+    def __call__(self, path):
+        self.decoded.append(path)
+        if path not in self.sizes:
+            raise FileNotFoundError(path)
+        return Clip(self.sizes[path])
+
+
+def test_least_recently_used_clip_is_evicted():
+    decoder = CountingDecoder({"a": 4, "b": 4, "c": 4})
+    cache = ClipCache(max_bytes=10, decoder=decoder)
+    cache.get("a")
+    cache.get("b")
+    cache.get("a")  # a redevient le plus récent
+    cache.get("c")
+    assert list(cache.clips) == ["a", "c"]
+    assert cache.size == 8
+    cache.get("b")
+    assert decoder.decoded == ["a", "b", "c", "b"]
+
+
+def test_clip_larger_than_the_cache_is_not_kept():
+    cache = ClipCache(max_bytes=10, decoder=CountingDecoder({"big": 11}))
+    assert len(cache.get("big").raw_data) == 11
+    assert (list(cache.clips), cache.size) == ([], 0)
+
+
+def test_adding_a_clip_again_replaces_it():
+    cache = ClipCache(max_bytes=10)
+    cache.add("a", Clip(4))
+    cache.add("a", Clip(6))
+    assert cache.size == 6
+
+
+def test_retain_and_preload():
+    decoder = CountingDecoder({"a": 2, "b": 2})
+    cache = ClipCache(max_bytes=10, decoder=decoder)
+    cache.preload(["a", "b", "missing", "a"])  # un fichier illisible n'arrête pas le préchargement
+    assert decoder.decoded == ["a", "b", "missing"]
+    cache.retain(["b"])
+    assert (list(cache.clips), cache.size) == (["b"], 2)
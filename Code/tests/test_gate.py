@@ -0,0 +1,41 @@
+import numpy as np
+from gate import BarkGate, block_features
+from spectral import SAMPLE_RATE
+
+BLOCK_SIZE = 1024
+TIME = np.arange(BLOCK_SIZE) / SAMPLE_RATE
+
+
+def tone(*frequencies):
+    return sum(np.sin(2 * np.pi * frequency * TIME) for frequency in frequencies).astype(np.float32)
+
+
+def test_harmonic_block_in_the_bark_bands_passes():
+    assert BarkGate().is_bark_like(tone(700, 1400, 2100))
+
+
+def test_noise_hum_and_hiss_are_rejected():
+    gate = BarkGate()
+    rng = np.random.default_rng(0)
+    assert not gate.is_bark_like(rng.standard_normal(BLOCK_SIZE).astype(np.float32))  # spectre plat
+    assert not gate.is_bark_like(tone(100))  # sous 300 Hz
+    assert not gate.is_bark_like(tone(9000))  # beaucoup de passages par zéro
+    assert gate.stats() == {"passed": 0, "avoided_analyses": 3}
+
+
+def test_silence_is_not_bark_like():
+    assert block_features(np.zeros(BLOCK_SIZE, dtype=np.float32)) == (0.0, 0.0, 1.0)
+    assert not BarkGate().is_bark_like(np.zeros(BLOCK_SIZE, dtype=np.float32))
+
+
+def test_disabled_gate_lets_everything_through():
+    gate = BarkGate(enabled=False)
+    assert gate.is_bark_like(tone(100))
+    assert gate.stats() == {"passed": 0, "avoided_analyses": 0}
+
+
+def test_classify_does_not_count():
+    gate = BarkGate()
+    assert gate.classify(tone(700, 1400))
+    assert not gate.classify(tone(100))
+    assert gate.stats() == {"passed": 0, "avoided_analyses": 0}
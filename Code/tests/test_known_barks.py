@@ -0,0 +1,69 @@
+import time
+import pytest
+from known_barks import KnownBarkStore
+
+HARMONICS = [(440.0, 1.0), (880.0, 0.8)]
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+@pytest.fixture
+def table():
+    # Contenu de knownbarks et sa version, modifiables par le test comme par un autre processus
+    return {"barks": {1: HARMONICS}, "version": (1, 2), "fail": False}
+
+
+def make_store(table, check_interval=0.02):
+    def version_loader():
+        if table["fail"]:
+            raise ConnectionError("database unreachable")
+        return table["version"]
+    store = KnownBarkStore(loader=lambda: dict(table["barks"]), version_loader=version_loader,
+                           check_interval=check_interval)
+    store.reload()
+    return store
+
+
+def test_templates_enrolled_elsewhere_are_loaded_in_the_background(table):
+    store = make_store(table)
+    try:
+        table["barks"] = {1: HARMONICS, 2: [(600.0, 1.0)]}
+        table["version"] = (2, 3)
+        assert wait_for(lambda: 2 in store.templates)
+    finally:
+        store.close()
+
+
+def test_matching_does_not_query_the_version(table):
+    store = make_store(table, check_interval=60)
+    try:
+        table["fail"] = True
+        assert store.best_match(HARMONICS, 0.5, 0.9, 0.2) == (1, 1.0)
+    finally:
+        store.close()
+
+
+def test_failed_version_check_keeps_the_templates(table):
+    store = make_store(table)
+    try:
+        table["fail"] = True
+        assert store.check_version() is False
+        assert store.best_match(HARMONICS, 0.5, 0.9, 0.2) == (1, 1.0)
+    finally:
+        store.close()
+
+
+def test_failed_reload_keeps_the_templates(table):
+    store = make_store(table, check_interval=60)
+    try:
+        table["fail"] = True
+        store.invalidate()
+        assert store.reload() is False
+        assert store.best_match(HARMONICS, 0.5, 0.9, 0.2) == (1, 1.0)
+    finally:
+        store.close()
@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+from matcher import TemplateMatcher
+
+
+def brute_force_best_match(matcher, harmonics, harmonic_threshold, amplitude_threshold, resemblance_threshold):
+    ratios = matcher.resemblance(harmonics, harmonic_threshold, amplitude_threshold)
+    if len(ratios) == 0 or ratios.max() == 0:
+        return None, 0.0
+    best = max(range(len(ratios)), key=lambda row: (ratios[row], -matcher.bark_ids[row]))
+    if ratios[best] <= resemblance_threshold:
+        return None, float(ratios[best])
+    return int(matcher.bark_ids[best]), float(ratios[best])
+
+
+def random_harmonics(rng, count):
+    frequencies = np.sort(rng.uniform(200, 4000, count))
+    return [(float(frequency), float(amplitude)) for frequency, amplitude in zip(frequencies, rng.uniform(0.6, 1, count))]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_index_agrees_with_a_full_scan(seed):
+    rng = np.random.default_rng(seed)
+    templates = {bark_id: random_harmonics(rng, rng.integers(1, 12)) for bark_id in range(1, 200)}
+    matcher = TemplateMatcher(templates)
+    for bark_id in rng.choice(list(templates), 20):
+        # Harmoniques d'un modèle connu, légèrement décalées, plus quelques harmoniques parasites
+        harmonics = [(frequency * rng.uniform(0.98, 1.02), amplitude) for frequency, amplitude in templates[bark_id]]
+        harmonics += random_harmonics(rng, 3)
+        for thresholds in ((0.5, 0.9, 0.2), (0.99, 0.9, 0.5), (0.0, 0.9, 0.2)):
+            expected = brute_force_best_match(matcher, harmonics, *thresholds)
+            bark, ratio = matcher.best_match(harmonics, *thresholds)
+            assert bark == expected[0]
+            assert ratio == pytest.approx(expected[1])
+
+
+def test_ties_go_to_the_lowest_id():
+    harmonics = [(440.0, 1.0), (880.0, 0.8)]
+    matcher = TemplateMatcher({7: harmonics, 3: harmonics, 5: [(1000.0, 1.0)]})
+    assert matcher.best_match(harmonics, 0.5, 0.9, 0.2) == (3, 1.0)
+
+
+def test_no_templates_or_no_harmonics():
+    assert TemplateMatcher({}).best_match([(440.0, 1.0)], 0.5, 0.9, 0.2) == (None, 0.0)
+    assert TemplateMatcher({1: [(440.0, 1.0)]}).best_match([], 0.5, 0.9, 0.2) == (None, 0.0)
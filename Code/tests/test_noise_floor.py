@@ -0,0 +1,41 @@
+import numpy as np
+from noise_floor import NoiseFloor
+from spectral import SAMPLE_RATE
+
+BLOCK_SIZE = 1024
+
+
+def noise_block(rng, gain_db):
+    return (rng.standard_normal(BLOCK_SIZE) * 10 ** (gain_db / 20)).astype(np.float32)
+
+
+def test_floor_settles_on_the_configured_quantile():
+    rng = np.random.default_rng(0)
+    noise_floor = NoiseFloor(quantile=0.2)
+    above = []
+    for i in range(6000):
+        noise_floor.update(noise_block(rng, rng.uniform(-60, -40)))
+        if i >= 2000:
+            above.append(noise_floor.level > noise_floor.floor)
+    # 20e centile : environ 80 % des blocs au-dessus du plancher dans chaque bande
+    assert np.allclose(np.mean(above, axis=0), 0.8, atol=0.05)
+
+
+def test_loud_block_stands_out_and_the_floor_rises_slowly():
+    rng = np.random.default_rng(1)
+    noise_floor = NoiseFloor()
+    for _ in range(500):
+        noise_floor.update(noise_block(rng, -60))
+    quiet_floor = noise_floor.floor.copy()
+    assert noise_floor.update(noise_block(rng, -20)) > 30
+    # Une seconde de bruit fort ne fait monter le plancher que de adaptation * q dB
+    for _ in range(SAMPLE_RATE // BLOCK_SIZE - 1):
+        noise_floor.update(noise_block(rng, -20))
+    assert np.all(noise_floor.floor - quiet_floor < 10)
+
+
+def test_digital_silence_is_finite():
+    noise_floor = NoiseFloor()
+    assert noise_floor.stats()["floor_db"] is None
+    assert noise_floor.update(np.zeros(BLOCK_SIZE, dtype=np.float32)) == 0.0
+    assert np.all(np.isfinite(noise_floor.floor))
@@ -0,0 +1,63 @@
+import pytest
+from protocol import (MessageType, ProtocolError, FrameDecoder, HEADER, MAGIC, MAX_PAYLOAD_SIZE, encode_frame,
+                      is_framed, is_partial_magic, decode_thresholds, encode_thresholds, parse_legacy_command)
+
+
+def test_frames_split_across_reads():
+    data = encode_frame(MessageType.REQUEST_PARAMETERS, 7, b"abc") + encode_frame(MessageType.START, 8)
+    decoder = FrameDecoder()
+    frames = []
+    for i in range(len(data)):
+        frames += decoder.feed(data[i:i + 1])
+    assert frames == [(MessageType.REQUEST_PARAMETERS, 7, b"abc"), (MessageType.START, 8, b"")]
+
+
+def test_several_frames_in_one_read():
+    data = encode_frame(MessageType.STOP, 1) + encode_frame(MessageType.MANUAL_MESSAGE, 2, "Papa")
+    assert FrameDecoder().feed(data) == [(MessageType.STOP, 1, b""), (MessageType.MANUAL_MESSAGE, 2, b"Papa")]
+
+
+def test_upload_begin_leaves_the_file_in_the_buffer():
+    data = (encode_frame(MessageType.UPLOAD_BEGIN, 3, '{"sender": "Papa", "size": 4}') + b"RIFF"
+            + encode_frame(MessageType.START, 4))
+    decoder = FrameDecoder()
+    assert decoder.feed(data) == [(MessageType.UPLOAD_BEGIN, 3, b'{"sender": "Papa", "size": 4}')]
+    assert decoder.take(4) == b"RIFF"
+    assert decoder.feed(b"") == [(MessageType.START, 4, b"")]
+
+
+def test_mode_is_decided_once_the_magic_has_arrived():
+    frame = encode_frame(MessageType.START, 1)
+    assert is_partial_magic(frame[:1]) and not is_framed(frame[:1])
+    assert not is_partial_magic(frame[:2]) and is_framed(frame[:2])
+    assert not is_partial_magic(b"MA") and not is_framed(b"MANUAL")
+    assert not is_partial_magic(b"1")
+
+
+@pytest.mark.parametrize("data", [
+    b"XX" + bytes(HEADER.size),
+    encode_frame(MessageType.START, 1, version=9),
+    HEADER.pack(MAGIC, 1, MessageType.AUDIO_FILE, 0, MAX_PAYLOAD_SIZE + 1),
+    HEADER.pack(MAGIC, 1, 0x7F, 0, 0),
+])
+def test_invalid_frames(data):
+    with pytest.raises(ProtocolError):
+        FrameDecoder().feed(data)
+
+
+@pytest.mark.parametrize("payload", [b"[12, 0.3, 60]", b"12,0.3,60", "(12, 0.3, 60)", encode_thresholds(12, 0.3, 60)])
+def test_decode_thresholds(payload):
+    assert decode_thresholds(payload) == (12.0, 0.3, 60.0)
+
+
+@pytest.mark.parametrize("payload", [b"[12, 0.3]", b"[a, b, c]", b""])
+def test_decode_invalid_thresholds(payload):
+    with pytest.raises(ProtocolError):
+        decode_thresholds(payload)
+
+
+def test_legacy_commands():
+    assert parse_legacy_command("1") == (MessageType.START, b"")
+    assert parse_legacy_command("3 [12, 0.3, 60]") == (MessageType.SET_THRESHOLDS, b"[12, 0.3, 60]")
+    assert parse_legacy_command("SUBSCRIBE") == (MessageType.SUBSCRIBE, b"")
+    assert parse_legacy_command("HELLO") == (None, b"")
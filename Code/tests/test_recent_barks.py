@@ -0,0 +1,26 @@
+from datetime import datetime, timedelta
+from recent_barks import RecentBarks
+
+NOW = datetime(2024, 5, 10, 12, 0, 0)
+
+
+def test_barks_older_than_the_window_are_hidden():
+    loaded = [(NOW - timedelta(days=4), "Automatic", "Papa"), (NOW - timedelta(days=1), "Manual", "Maman")]
+    recent = RecentBarks(loader=lambda: loaded)
+    assert recent.get(NOW) == [loaded[1]]
+    assert recent.expires_at(NOW) == loaded[1][0] + timedelta(days=3)
+    assert recent.get(NOW + timedelta(days=3)) == []
+    assert recent.expires_at(NOW + timedelta(days=3)) is None
+
+
+def test_recorded_barks_are_added_most_recent_first():
+    recent = RecentBarks(loader=lambda: [], limit=2)
+    recent.add(["2024-05-10 10:00:00", "Automatic", "Papa"])
+    recent.add([NOW - timedelta(hours=1), "Manual", "Oscar"])
+    recent.add(["2024-05-10 09:00:00", "Manual", "Maman"])  # plus ancien que les deux gardés
+    assert [bark[2] for bark in recent.get(NOW)] == ["Oscar", "Papa"]
+
+
+def test_failed_load_is_reported():
+    recent = RecentBarks(loader=lambda: False)
+    assert recent.get(NOW) is False
@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+from ring_buffer import RingBuffer
+
+
+def test_window_across_the_wrap_is_contiguous():
+    buffer = RingBuffer(8)
+    samples = np.arange(13, dtype=np.float32)
+    for start in range(0, len(samples), 3):
+        buffer.write(samples[start:start + 3])
+    window = buffer.window(6, 13)
+    np.testing.assert_array_equal(window, samples[6:13])
+    assert window.base is buffer.data  # vue, pas de copie
+
+
+def test_overwritten_samples_are_not_returned():
+    buffer = RingBuffer(8)
+    buffer.write(np.arange(10, dtype=np.float32))
+    assert buffer.oldest_position() == 2
+    with pytest.raises(ValueError):
+        buffer.window(4, 11)
+    # Un début trop ancien est ramené au plus ancien échantillon disponible
+    np.testing.assert_array_equal(buffer.window(0, 10), np.arange(2, 10))
+
+
+def test_write_larger_than_capacity_keeps_the_end():
+    buffer = RingBuffer(4)
+    buffer.write(np.arange(3, dtype=np.float32))
+    buffer.write(np.arange(3, 13, dtype=np.float32))
+    assert buffer.position == 13
+    np.testing.assert_array_equal(buffer.window(9, 13), [9, 10, 11, 12])
@@ -0,0 +1,42 @@
+from datetime import datetime, timedelta
+from db_requests import (get_parameters, modify_parameters, get_known_barks, get_known_barks_version,
+                         insert_known_barks, insert_barks, get_last_barks)
+
+
+def test_default_parameters(sqlite_backend):
+    parameters = {name: value for _, name, value in get_parameters()}
+    assert parameters == {"noise_threshold": 10.0, "resemblance_threshold": 0.7, "cooldown": 120.0, "delay": 2.0}
+
+
+def test_modify_parameters(sqlite_backend):
+    assert modify_parameters([("noise_threshold", 12), ("cooldown", 60)])
+    parameters = {name: value for _, name, value in get_parameters()}
+    assert parameters["noise_threshold"] == 12.0
+    assert parameters["cooldown"] == 60.0
+
+
+def test_known_barks_round_trip(sqlite_backend):
+    assert get_known_barks() == {}
+    empty_version = get_known_barks_version()
+    assert insert_known_barks([[(440, 1.0), (880, 0.5)], [(600, 0.9)]])
+    assert get_known_barks() == {1: [(440, 1.0), (880, 0.5)], 2: [(600, 0.9)]}
+    assert get_known_barks_version() != empty_version
+
+
+def test_barks_round_trip(sqlite_backend):
+    now = datetime.now().replace(microsecond=0)
+    barks = [[(now - timedelta(minutes=minutes)).strftime('%Y-%m-%d %H:%M:%S'), "Automatic", "Papa"]
+             for minutes in range(7)]
+    barks.append([(now - timedelta(days=4)).strftime('%Y-%m-%d %H:%M:%S'), "Manual", "Maman"])
+    assert insert_barks(barks)
+    last_barks = get_last_barks()
+    assert [bark[0] for bark in last_barks] == [now - timedelta(minutes=minutes) for minutes in range(5)]
+    assert last_barks[0][1:] == ("Automatic", "Papa")
+
+
+def test_invalid_bark_is_rejected_alone(sqlite_backend):
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    rejected = []
+    assert insert_barks([[now, "Manual", "Papa"], [now, "Manual", "Bogus"], [now, "Manual", "Maman"]], rejected)
+    assert rejected == [[now, "Manual", "Bogus"]]
+    assert sorted(bark[2] for bark in get_last_barks()) == ["Maman", "Papa"]
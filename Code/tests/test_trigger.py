@@ -0,0 +1,56 @@
+from trigger import TriggerState, IDLE, CAPTURING, COOLDOWN, TRIGGERED, CHECKPOINT, FINAL
+
+
+class FixedGate:
+
+    def __init__(self, bark_like):
+        self.bark_like = bark_like
+
+    def is_bark_like(self, block):
+        return self.bark_like
+
+
+def test_capture_emits_checkpoints_then_final():
+    trigger = TriggerState(post_trigger_samples=1000, checkpoint_samples=300)
+    assert trigger.step(100, loud=False) is None
+    assert trigger.step(200, loud=True) == TRIGGERED
+    assert (trigger.state, trigger.capture, trigger.trigger_position) == (CAPTURING, 1, 200)
+    events = [trigger.step(position, loud=True) for position in range(300, 1300, 100)]
+    assert events == [None, None, CHECKPOINT, None, None, CHECKPOINT, None, None, CHECKPOINT, FINAL]
+    assert trigger.state == IDLE
+    assert trigger.step(1300, loud=True) == TRIGGERED
+    assert trigger.capture == 2
+
+
+def test_without_checkpoints_only_the_final_window_is_emitted():
+    trigger = TriggerState(post_trigger_samples=500)
+    trigger.step(0, loud=True)
+    assert [trigger.step(position, loud=True) for position in range(100, 600, 100)] == [None] * 4 + [FINAL]
+
+
+def test_gate_is_consulted_only_for_loud_blocks():
+    trigger = TriggerState(post_trigger_samples=500)
+    assert trigger.step(0, loud=True, gate=FixedGate(False), block=None) is None
+    assert trigger.state == IDLE
+    assert trigger.step(0, loud=False, gate=None) is None
+    assert trigger.step(100, loud=True, gate=FixedGate(True), block=None) == TRIGGERED
+
+
+def test_cooldown_ignores_loud_blocks_until_its_end():
+    trigger = TriggerState(post_trigger_samples=500)
+    trigger.step(0, loud=True)
+    trigger.start_cooldown(2000)
+    trigger.start_cooldown(1500)  # une correspondance plus ancienne ne raccourcit pas le délai
+    assert trigger.state == COOLDOWN
+    assert trigger.step(1999, loud=True) is None
+    assert trigger.step(2000, loud=True) is None
+    assert trigger.state == IDLE
+    assert trigger.step(2100, loud=True) == TRIGGERED
+
+
+def test_reset_leaves_the_cooldown():
+    trigger = TriggerState(post_trigger_samples=500)
+    trigger.start_cooldown(10000)
+    trigger.reset()
+    assert trigger.state == IDLE
+    assert trigger.step(0, loud=True) == TRIGGERED
@@ -0,0 +1,87 @@
+import hashlib
+import os
+import pytest
+from uploads import (AudioUpload, UploadError, MAX_HEADER_SIZE, MAX_UPLOAD_SIZE, receive_upload, split_upload_header,
+                     parse_upload_header)
+
+
+class FakeSocket:
+    # Rend les données par petits morceaux, comme un vrai socket
+
+    def __init__(self, data, chunk=5):
+        self.data = data
+        self.chunk = chunk
+
+    def recv_into(self, view, size):
+        received = self.data[:min(size, self.chunk)]
+        self.data = self.data[len(received):]
+        view[:len(received)] = received
+        return len(received)
+
+
+def files_in(directory):
+    return sorted(os.listdir(directory))
+
+
+def test_upload_is_renamed_once_complete(tmp_path):
+    content = b"RIFF" + bytes(range(50))
+    upload = AudioUpload("Papa", len(content), hashlib.sha256(content).hexdigest(), directory=str(tmp_path))
+    path = receive_upload(FakeSocket(content[10:]), upload, initial=content[:10])
+    assert os.path.dirname(path) == str(tmp_path / "Papa")
+    assert os.path.basename(path).startswith("audio_") and path.endswith(".m4a")
+    assert files_in(tmp_path / "Papa") == [os.path.basename(path)]
+    with open(path, "rb") as f:
+        assert f.read() == content
+
+
+def test_uploads_in_the_same_second_do_not_overwrite_each_other(tmp_path):
+    paths = set()
+    for content in (b"first", b"second"):
+        upload = AudioUpload("Papa", len(content), directory=str(tmp_path))
+        paths.add(receive_upload(FakeSocket(content), upload))
+    assert len(paths) == 2
+
+
+@pytest.mark.parametrize("sender", ["", "../Papa", ".Papa", "Papa/Maman"])
+def test_invalid_sender(tmp_path, sender):
+    with pytest.raises(UploadError):
+        AudioUpload(sender, 10, directory=str(tmp_path))
+
+
+def test_size_limit(tmp_path):
+    with pytest.raises(UploadError):
+        AudioUpload("Papa", MAX_UPLOAD_SIZE + 1, directory=str(tmp_path))
+    upload = AudioUpload("Papa", 4, directory=str(tmp_path))
+    with pytest.raises(UploadError):
+        upload.write(b"12345")
+    upload.abort()
+    assert files_in(tmp_path / "Papa") == []
+
+
+def test_checksum_mismatch_leaves_no_file(tmp_path):
+    upload = AudioUpload("Papa", 4, "0" * 64, directory=str(tmp_path))
+    with pytest.raises(UploadError):
+        receive_upload(FakeSocket(b"RIFF"), upload)
+    assert files_in(tmp_path / "Papa") == []
+
+
+def test_connection_closed_during_upload_leaves_no_file(tmp_path):
+    upload = AudioUpload("Papa", 10, directory=str(tmp_path))
+    with pytest.raises(UploadError):
+        receive_upload(FakeSocket(b"RIFF"), upload)
+    assert files_in(tmp_path / "Papa") == []
+
+
+def test_split_upload_header():
+    assert split_upload_header(b"AUDIO_FILE 4 Pa") is None
+    assert split_upload_header(b"AUDIO_FILE 4 Papa\nRIFF1") == ("AUDIO_FILE 4 Papa", b"RIFF1")
+    with pytest.raises(UploadError):
+        split_upload_header(b"A" * (MAX_HEADER_SIZE + 1))
+
+
+def test_parse_upload_header():
+    assert parse_upload_header("AUDIO_FILE 4 Papa") == ("Papa", 4, None)
+    assert parse_upload_header("AUDIO_FILE 4 Papa abcd") == ("Papa", 4, "abcd")
+    for header in ("AUDIO_FILE four Papa", "AUDIO 4 Papa", "AUDIO_FILE 4"):
+        with pytest.raises(UploadError):
+            parse_upload_header(header)
@@ -0,0 +1,47 @@
+# États de la capture
+IDLE, CAPTURING, COOLDOWN = "idle", "capturing", "cooldown"
+# Événements renvoyés par TriggerState.step
+TRIGGERED, CHECKPOINT, FINAL = "triggered", "checkpoint", "final"
+
+
+class TriggerState:
+    # Déclenchement, capture et délai de silence comptés en échantillons ; modifié uniquement par le callback audio
+
+    def __init__(self, post_trigger_samples, checkpoint_samples=None):
+        self.post_trigger_samples = post_trigger_samples
+        self.checkpoint_samples = checkpoint_samples  # None : seule la fenêtre complète est analysée
+        self.state = IDLE
+        self.trigger_position = 0
+        self.next_checkpoint = 0
+        self.cooldown_end = 0
+        self.capture = 0  # numéro de la capture en cours
+
+    def step(self, position, loud, gate=None, block=None):
+        # Le filtre coûte une FFT : il n'est appelé que pour un bloc fort hors capture
+        if self.state == COOLDOWN:
+            if position >= self.cooldown_end:
+                self.state = IDLE
+        elif self.state == CAPTURING:
+            if position >= self.trigger_position + self.post_trigger_samples:
+                self.state = IDLE
+                return FINAL
+            if self.checkpoint_samples is not None and position >= self.next_checkpoint:
+                self.next_checkpoint = position + self.checkpoint_samples
+                return CHECKPOINT
+        elif loud and (gate is None or gate.is_bark_like(block)):
+            self.state = CAPTURING
+            self.capture += 1
+            self.trigger_position = position
+            if self.checkpoint_samples is not None:
+                self.next_checkpoint = position + self.checkpoint_samples
+            return TRIGGERED
+        return None
+
+    def start_cooldown(self, cooldown_end):
+        # Une correspondance (même avant la fin de la fenêtre) termine la capture
+        self.state = COOLDOWN
+        self.cooldown_end = max(self.cooldown_end, cooldown_end)
+
+    def reset(self):
+        self.state = IDLE
+        self.cooldown_end = 0
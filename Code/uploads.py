@@ -0,0 +1,120 @@
+import hashlib
+import json
+import os
+import tempfile
+import uuid
+from datetime import datetime
+
+AUDIO_DIRECTORY = "./audio"
+CHUNK_SIZE = 64 * 1024
+MAX_UPLOAD_SIZE = 64 * 1024 * 1024
+MAX_HEADER_SIZE = 1024
+END_OF_FILE = b'END_OF_FILE_'
+
+
+class UploadError(Exception):
+    pass
+
+
+class AudioUpload:
+
+    def __init__(self, sender, size=None, checksum=None, directory=AUDIO_DIRECTORY):
+        if not sender or os.path.basename(sender) != sender or sender.startswith("."):
+            raise UploadError(f"Invalid sender: {sender!r}")
+        if size is not None and not 0 <= size <= MAX_UPLOAD_SIZE:
+            raise UploadError(f"Invalid upload size: {size}")
+        self.sender = sender
+        self.remaining = size
+        self.checksum = checksum.lower() if checksum else None
+        self.hash = hashlib.sha256() if checksum else None
+        self.path = os.path.join(directory, sender)
+        os.makedirs(self.path, exist_ok=True)
+        self.file = tempfile.NamedTemporaryFile(dir=self.path, prefix=".upload_", suffix=".part", delete=False)
+
+    def write(self, data):
+        if self.remaining is not None:
+            if len(data) > self.remaining:
+                raise UploadError("More data received than declared.")
+            self.remaining -= len(data)
+        self.file.write(data)
+        if self.hash is not None:
+            self.hash.update(data)
+
+    def finish(self):
+        try:
+            if self.remaining:
+                raise UploadError(f"Upload incomplete, {self.remaining} bytes missing.")
+            if self.hash is not None and self.hash.hexdigest() != self.checksum:
+                raise UploadError("Checksum mismatch.")
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.file.close()
+        except Exception:
+            self.abort()
+            raise
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        # Suffixe aléatoire : deux envois dans la même seconde ne s'écrasent pas
+        file_name = os.path.join(self.path, f'audio_{timestamp}_{uuid.uuid4().hex[:8]}.m4a')
+        os.replace(self.file.name, file_name)
+        return file_name
+
+    def abort(self):
+        self.file.close()
+        if os.path.exists(self.file.name):
+            os.remove(self.file.name)
+
+
+def parse_upload_header(header):
+    # "AUDIO_FILE <taille> <expéditeur> [sha256]"
+    fields = header.split()
+    if len(fields) not in (3, 4) or fields[0] != "AUDIO_FILE":
+        raise UploadError(f"Invalid upload header: {header!r}")
+    try:
+        size = int(fields[1])
+    except ValueError:
+        raise UploadError(f"Invalid upload size: {fields[1]!r}")
+    return fields[2], size, fields[3] if len(fields) == 4 else None
+
+
+def split_upload_header(data):
+    # (en-tête, octets suivants), ou None tant que la fin de ligne n'est pas arrivée
+    header, newline, rest = bytes(data).partition(b"\n")
+    if not newline:
+        if len(data) > MAX_HEADER_SIZE:
+            raise UploadError("Upload header too long.")
+        return None
+    return header.decode(), rest
+
+
+def parse_upload_metadata(payload):
+    metadata = json.loads(payload)
+    return metadata["sender"], int(metadata["size"]), metadata.get("sha256")
+
+
+def encode_upload_metadata(sender, size, checksum=None):
+    metadata = {"sender": sender, "size": size}
+    if checksum:
+        metadata["sha256"] = checksum
+    return json.dumps(metadata)
+
+
+def receive_upload(client_socket, upload, initial=b""):
+    if initial:
+        upload.write(initial)
+    buffer = bytearray(CHUNK_SIZE)
+    view = memoryview(buffer)
+    try:
+        while upload.remaining:
+            received = client_socket.recv_into(view, min(CHUNK_SIZE, upload.remaining))
+            if not received:
+                raise UploadError("Connection closed during upload.")
+            upload.write(view[:received])
+    except Exception:
+        upload.abort()
+        raise
+    return upload.finish()
+
+
+def find_end_of_file(buffer, searched):
+    # Le marqueur peut être coupé entre deux lectures : on recherche depuis la fin précédente
+    return buffer.find(END_OF_FILE, max(0, searched - len(END_OF_FILE)))